@@ -0,0 +1,148 @@
+"""
+Builds many documents at once, each with its own .tex and configuration
+file, using a pool of processes.
+
+The documents are listed in a manifest, written in YAML:
+
+    documents:
+      - tex: "notes/notes.tex"      # Relative to the manifest.
+        config: "notes/config.yml"
+      - tex: "problems/problems.tex"
+        config: "problems/config.yml"
+
+    cache: ".projection-cache"  # Optional, a pandoc cache that is shared
+                                # by all of the documents.
+    incremental: false          # Optional, see parser.config.Config.
+    processes: 8                # Optional, defaults to the number of CPUs.
+
+Each document is built as if we were running in the directory that holds
+its configuration file, so the database in meta: database is relative to
+that. Several documents may share a database, but only if incremental is
+false (incremental runs remove any rows that they did not write).
+
+This can also be run as
+
+    python -m projection.build manifest.yml
+"""
+
+from .parser.config import Config
+
+from concurrent.futures import ProcessPoolExecutor
+
+import argparse
+import yaml
+import os
+
+
+def read_manifest(manifest_filename):
+    """
+    Reads the manifest, and returns it with all of the paths made absolute.
+    Each document also gets the absolute path of its database.
+    """
+
+    with open(manifest_filename, "r") as file:
+        manifest = yaml.safe_load(file)
+
+    directory = os.path.dirname(os.path.abspath(manifest_filename))
+
+    def resolve(path):
+        return os.path.join(directory, path)
+
+    if manifest.get("cache") is not None:
+        manifest["cache"] = resolve(manifest["cache"])
+
+    for document in manifest["documents"]:
+        document["tex"] = resolve(document["tex"])
+        document["config"] = resolve(document["config"])
+
+        with open(document["config"], "r") as file:
+            database = yaml.safe_load(file)["meta"]["database"]
+
+        document["database"] = os.path.normpath(
+            os.path.join(os.path.dirname(document["config"]), database)
+        )
+
+    return manifest
+
+
+def build_document(tex, config, incremental=False, cache=None):
+    """
+    Builds a single document. This runs in a worker process.
+
+    Returns the tex filename.
+    """
+
+    os.chdir(os.path.dirname(config))
+
+    # Each document goes through pandoc whole (so in one process), and the
+    # pool runs one document per CPU.
+    Config(tex, config, incremental=incremental, cache=cache)
+
+    return tex
+
+
+def build(manifest_filename, processes=None):
+    """
+    Builds all of the documents in the manifest, with a pool of processes.
+
+    If the build is not incremental, the databases are removed first (as a
+    full build writes every row again).
+
+    Returns the list of tex filenames that were built.
+    """
+
+    manifest = read_manifest(manifest_filename)
+
+    documents = manifest["documents"]
+    incremental = manifest.get("incremental", False)
+    cache = manifest.get("cache")
+
+    if processes is None:
+        processes = manifest.get("processes")
+
+    databases = [document["database"] for document in documents]
+
+    if incremental and len(set(databases)) != len(databases):
+        raise ValueError(
+            "Documents can only share a database if incremental is false."
+        )
+
+    if not incremental:
+        for database in set(databases):
+            if os.path.exists(database):
+                os.remove(database)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                build_document,
+                document["tex"],
+                document["config"],
+                incremental,
+                cache
+            )
+            for document in documents
+        ]
+
+        built = [future.result() for future in futures]
+
+    return built
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(
+        description="Build all of the documents in a manifest."
+    )
+
+    argument_parser.add_argument("manifest", help="The manifest (YAML) file.")
+    argument_parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="The number of documents to build at once."
+    )
+
+    arguments = argument_parser.parse_args()
+
+    for tex in build(arguments.manifest, processes=arguments.processes):
+        print(f"Built {tex}")
@@ -1 +1,2 @@
 from projection.frontend import printing
+from projection.frontend import template
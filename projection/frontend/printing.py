@@ -2,18 +2,21 @@
 Pretty-printing functions for the database objects.
 """
 
-from typing import List
+from typing import List, Tuple
+
+import html
 
 from ..parser.generators import Collector, Section
 
 def print_collectors(collectors: List[Collector]) -> str:
     """
-    Prints the collectors as a nice HTML list.
+    Prints the collectors (their captured text, escaped) as a nice HTML
+    list.
 
     Returns a string.
     """
 
-    create_li = lambda x: f"<li>{x.text}</li>"
+    create_li = lambda x: f"<li>{html.escape(x.text)}</li>"
     lis = "\n".join(list(map(create_li, collectors)))
 
     return f"<ul>\n{lis}\n</ul>"
@@ -28,3 +31,15 @@ def print_page_content(section: Section) -> str:
     
     return section.output_text
 
+
+def print_links(links: List[Tuple[str, str]]) -> str:
+    """
+    Prints (text, href) pairs as a HTML list of links.
+
+    Returns a string.
+    """
+
+    create_li = lambda x: f"<li><a href=\"{x[1]}\">{x[0]}</a></li>"
+    lis = "\n".join(list(map(create_li, links)))
+
+    return f"<ul>\n{lis}\n</ul>"
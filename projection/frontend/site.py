@@ -0,0 +1,325 @@
+"""
+Builds a static website from the database that parser.config.Config writes.
+
+Every section becomes a page (its text is converted from markdown to HTML by
+pandoc), listing the collectors that fall inside it. The pages given in the
+configuration file are added too:
+
+    + glossary, which lists all of the collectors of each type,
+    + subpages, which links to all of the section pages,
+    + plain, which shows its content (markdown, optional).
+
+and index.html links to all of these.
+
+The sections are streamed from the database, and the pages are rendered
+and written by a pool of workers as we go. Each page is written a piece at
+a time through the page.html template (see frontend.template). This can be
+run as
+
+    python -m projection.frontend.site config.yml output/
+"""
+
+from ..io import Database
+from .printing import print_collectors, print_links
+from .template import TemplateLoader
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import argparse
+import html
+import os
+import re
+
+import pypandoc
+import yaml
+
+
+def slug(text):
+    """
+    Makes text safe to use in a filename.
+    """
+
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "page"
+
+
+def section_title(section):
+    """
+    The title of a section's page: the text captured from its input (even
+    for sections with level 0, which have no heading), or its id if there
+    is none (for example, in databases written before Section.title).
+    """
+
+    return (section.title or "").strip() or section.id
+
+
+def markdown_to_html(text):
+    """
+    Converts markdown (as written to the database) to HTML, with pandoc.
+    """
+
+    return pypandoc.convert_text(
+        text, "html", format="markdown", extra_args=["--mathjax"]
+    )
+
+
+class Site(object):
+    """
+    Static site builder.
+
+    The database is the one given in meta: database in the configuration
+    file, unless an open io.Database is passed as database. processes is
+    the number of pages that are rendered at once (pandoc runs in a
+    subprocess, so these are threads). It defaults to the number of CPUs.
+
+    The templates are read from meta: templates in the configuration file
+    (or frontend/template), and compiled once. The compiled templates are
+    kept in the templates directory inside the pandoc cache (meta: cache).
+    """
+    def __init__(self, config_filename, output_directory, processes=None,
+            database=None):
+        with open(config_filename, "r") as file:
+            self.raw_data = yaml.safe_load(file)
+
+        self.output_directory = output_directory
+        self.processes = processes or os.cpu_count() or 1
+
+        if database is None:
+            self.db = Database(self.raw_data["meta"]["database"])
+        else:
+            self.db = database
+
+        meta = self.raw_data["meta"]
+
+        self.templates = TemplateLoader(
+            meta.get("templates"),
+            cache=os.path.join(
+                meta.get("cache", f"{meta['database']}.cache"), "templates"
+            )
+        )
+        self.page = self.templates.get("page.html")
+
+        self.title = html.escape(meta.get("title", ""))
+        self.section_names = [x["name"] for x in self.raw_data["sections"]]
+        self.collector_names = [
+            x["name"] for x in self.raw_data["collectors"]
+        ]
+        self.pages = self.raw_data.get("pages") or []
+
+        # {section id: [(title, filename)]}, filled in as we go.
+        self.links = {}
+
+        return
+
+
+    def build(self):
+        """
+        Renders and writes all of the pages. Returns the list of filenames
+        that were written.
+        """
+
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        self.links = {}
+        written = []
+
+        with ThreadPoolExecutor(max_workers=self.processes) as executor:
+            # Only keep a few pages in flight, so that we never hold the
+            # whole database in memory.
+            pending = deque()
+
+            for number, section in enumerate(self.db.iter_sections()):
+                filename = f"{slug(section.id)}-{number}.html"
+
+                self.links.setdefault(section.id, []).append(
+                    (html.escape(section_title(section)), filename)
+                )
+
+                pending.append(
+                    executor.submit(
+                        self.write_section,
+                        filename,
+                        section,
+                        self.section_collectors(section)
+                    )
+                )
+
+                if len(pending) > 2 * self.processes:
+                    written.append(pending.popleft().result())
+
+            # The database can only be read from this thread.
+            if any(page["type"] == "glossary" for page in self.pages):
+                collectors = self.all_collectors()
+            else:
+                collectors = {}
+
+            for page in self.pages:
+                pending.append(
+                    executor.submit(self.write_extra_page, page, collectors)
+                )
+
+            pending.append(executor.submit(self.write_index))
+
+            written += [future.result() for future in pending]
+
+        return written
+
+
+    def section_collectors(self, section):
+        """
+        Returns {collector name: list of collectors} for the collectors
+        that are inside section, with one lookup in the section_collectors
+        table.
+        """
+
+        collectors = {name: [] for name in self.collector_names}
+
+        for collector in self.db.select_section_collectors(section.uid):
+            collectors.setdefault(collector.id, []).append(collector)
+
+        return collectors
+
+
+    def write(self, filename, title, content):
+        """
+        Writes a page to the output directory, streaming content (an
+        iterable of strings) into the page template. Returns filename.
+        """
+
+        path = os.path.join(self.output_directory, filename)
+
+        with open(path, "w", encoding="utf-8") as file:
+            self.page.stream(
+                file, title=title, site_title=self.title, content=content
+            )
+
+        return filename
+
+
+    def write_section(self, filename, section, collectors):
+        """
+        Renders and writes the page for a section.
+        """
+
+        return self.write(
+            filename,
+            html.escape(section_title(section)),
+            self.section_content(section, collectors)
+        )
+
+
+    def section_content(self, section, collectors):
+        """
+        Yields the HTML for a section's page, a piece at a time.
+        """
+
+        yield markdown_to_html(section.text)
+
+        for name, items in collectors.items():
+            if items:
+                yield f"<h2>{html.escape(name)}</h2>\n"
+                yield print_collectors(items)
+                yield "\n"
+
+        return
+
+
+    def write_extra_page(self, page, collectors):
+        """
+        Renders and writes one of the pages from the configuration file.
+        collectors is the output of Site.all_collectors, for the glossary.
+        """
+
+        if page["type"] == "glossary":
+            content = self.glossary(collectors)
+        elif page["type"] == "subpages":
+            content = self.subpages()
+        elif page["type"] == "plain":
+            content = markdown_to_html(page.get("content", ""))
+        else:
+            raise ValueError(f"Unknown page type {page['type']}.")
+
+        return self.write(
+            f"{slug(page['name'])}.html", html.escape(page["name"]), content
+        )
+
+
+    def all_collectors(self):
+        """
+        Returns {collector name: list of collectors} for every collector.
+        """
+
+        collectors = {name: [] for name in self.collector_names}
+
+        for collector in self.db.iter_collectors():
+            collectors.setdefault(collector.id, []).append(collector)
+
+        return collectors
+
+
+    def glossary(self, collectors):
+        """
+        Lists the collectors, by type, in alphabetical order. Yields the
+        HTML a piece at a time.
+        """
+
+        for name, items in collectors.items():
+            yield f"<h2>{html.escape(name)}</h2>\n"
+            yield print_collectors(sorted(items, key=lambda x: x.text))
+            yield "\n"
+
+        return
+
+
+    def subpages(self):
+        """
+        Links to all of the section pages, by type. Yields the HTML a piece
+        at a time.
+        """
+
+        for name in self.section_names:
+            yield f"<h2>{html.escape(name)}</h2>\n"
+            yield print_links(self.links.get(name, []))
+            yield "\n"
+
+        return
+
+
+    def write_index(self):
+        """
+        Writes index.html, which links to the pages from the configuration
+        file and to all of the section pages.
+        """
+
+        links = [
+            (html.escape(page["name"]), f"{slug(page['name'])}.html")
+            for page in self.pages
+        ]
+
+        def content():
+            yield print_links(links)
+            yield "\n"
+            yield from self.subpages()
+
+        return self.write("index.html", self.title, content())
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(
+        description="Build a static website from a document's database."
+    )
+
+    argument_parser.add_argument("config", help="The configuration file.")
+    argument_parser.add_argument("output", help="The output directory.")
+    argument_parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="The number of pages to render at once."
+    )
+
+    arguments = argument_parser.parse_args()
+
+    Site(
+        arguments.config, arguments.output, processes=arguments.processes
+    ).build()
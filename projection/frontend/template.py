@@ -0,0 +1,154 @@
+"""
+Contains the page templates. A template is HTML with {{ name }} where each
+value should go, for example
+
+    <h1>{{ title }}</h1>
+    {{ content }}
+
+Values are inserted as they are (so they should already be HTML). They can
+be strings or iterables of strings, which are written out one at a time.
+
+The default templates are in frontend/template; set meta: templates in
+the configuration file to use your own directory instead.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+
+
+# The directory that holds the default templates.
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(__file__), "template")
+
+VARIABLE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class Template(object):
+    """
+    A compiled template. parts alternates between literal text and the
+    names of values, starting and ending with literal text (which may be
+    empty).
+    """
+    def __init__(self, parts):
+        self.parts = parts
+
+        return
+
+
+    @classmethod
+    def compile(cls, text):
+        """
+        Compile the text of a template.
+        """
+
+        return cls(VARIABLE.split(text))
+
+
+    def stream(self, file, **values):
+        """
+        Write the template, with values filled in, to file (anything with a
+        write function), a piece at a time.
+        """
+
+        for index, part in enumerate(self.parts):
+            if index % 2 == 0:
+                file.write(part)
+                continue
+
+            try:
+                value = values[part]
+            except KeyError:
+                raise KeyError(f"No value given for {{{{ {part} }}}}.")
+
+            if isinstance(value, str):
+                file.write(value)
+            else:
+                for chunk in value:
+                    file.write(chunk)
+
+        return
+
+
+    def render(self, **values):
+        """
+        Returns the template, with values filled in, as a string.
+        """
+
+        output = io.StringIO()
+
+        self.stream(output, **values)
+
+        return output.getvalue()
+
+
+class TemplateLoader(object):
+    """
+    Loads (and compiles) the templates in directory, each only once.
+
+    If cache (a directory) is given, the compiled templates are also kept
+    there, keyed by a hash of their text, so that later builds do not have
+    to compile them again.
+    """
+    def __init__(self, directory=None, cache=None):
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.cache = cache
+        self.templates = {}
+
+        if self.cache is not None:
+            os.makedirs(self.cache, exist_ok=True)
+
+        return
+
+
+    def get(self, name):
+        """
+        Returns the compiled template called name (e.g. "page.html").
+        """
+
+        try:
+            return self.templates[name]
+        except KeyError:
+            pass
+
+        filename = os.path.join(self.directory, name)
+
+        with open(filename, "r", encoding="utf-8") as file:
+            text = file.read()
+
+        if self.cache is None:
+            template = Template.compile(text)
+        else:
+            template = self.cached(text)
+
+        self.templates[name] = template
+
+        return template
+
+
+    def cached(self, text):
+        """
+        Returns the compiled template for text, from the cache if possible.
+        """
+
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = os.path.join(self.cache, f"{key}.json")
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return Template(json.load(file))
+        except (FileNotFoundError, ValueError):
+            pass
+
+        template = Template.compile(text)
+
+        # Write atomically, as the cache may be shared between processes.
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(template.parts, file)
+
+        os.replace(temporary, path)
+
+        return template
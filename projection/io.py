@@ -6,6 +6,9 @@ and pushing/pulling our objects to them.
 """
 
 import sqlite3
+import hashlib
+import html
+import json
 
 from .parser.generators import \
     Collector,\
@@ -13,12 +16,53 @@ from .parser.generators import \
     Removal
 
 
+# The table that each type of generator is stored in.
+TABLES = {
+    Collector: "collectors",
+    Section: "sections",
+    Removal: "removals",
+}
+
+# The position of the regex in the packed tuple for each table. In the
+# database, this column holds a key into the generator_types table instead.
+REGEX_COLUMN = {
+    "collectors": 3,
+    "sections": 4,
+    "removals": 1,
+}
+
+# The columns that identify a row for Database.update_table. For the match
+# tables this is the uid, which stays the same when the match moves.
+KEY_COLUMNS = {
+    "collectors": (4,),
+    "sections": (5,),
+    "removals": (2,),
+    "section_collectors": (0, 1),
+    "search_text": (0, 1),
+}
+
+
 class Database(object):
     """
     Database writer object.
+
+    Rather than storing the regex in every row, each distinct regex (i.e.
+    each configured syntax) is stored once in the generator_types table, and
+    the rows store its integer key. This is invisible from the outside --
+    the insert_* functions take packed tuples including the regex, and the
+    objects that come back out have it set (all sharing one string per
+    syntax).
+
+    timeout is how long (in seconds) to wait for another process that is
+    writing to the same database file.
+
+    If search is True, we also keep a full-text (SQLite FTS5) index of the
+    text of the sections and collectors, in the search_text table, which
+    can be queried with Database.search. Once the table exists, it is used
+    whenever the database is opened (Database.searchable).
     """
-    def __init__(self, filename):
-        self.conn = sqlite3.connect(filename)
+    def __init__(self, filename, timeout=60.0, search=False):
+        self.conn = sqlite3.connect(filename, timeout=timeout)
 
         try:
             self.create_tables()
@@ -26,6 +70,20 @@ class Database(object):
             # Tables already created
             pass
 
+        self.upgrade_tables()
+
+        if search:
+            self.create_search_table()
+
+        self.searchable = self.conn.execute("""
+            select count(*) from sqlite_master where name = 'search_text'
+            """).fetchone()[0] > 0
+
+        self.types = {}
+        self.type_keys = {}
+
+        self.load_types()
+
 
 
     def __del__(self):
@@ -42,26 +100,74 @@ class Database(object):
         c = self.conn.cursor()
 
         c.execute("""
-            create table collectors
+            create table if not exists generator_types
+            (key integer primary key, regex text unique)"""
+        )
+
+        c.execute("""
+            create table if not exists collectors
             (input text, line int, capture int, 
-             regex text, uid text, text text,
+             type int, uid text, text text,
              temporary_replacement text, output_text text, id text)"""
         )
 
         c.execute("""
-            create table sections
+            create table if not exists sections
             (input text, line int, level int, capture int, 
-             regex text, uid text, text text,
+             type int, uid text, text text,
              temporary_replacement text, output_text text,
-             startline int, endline int, id text)"""
+             startline int, endline int, id text, title text)"""
         )
 
         c.execute("""
-            create table removals
-            (input text, regex text, uid text, id text, line int,
+            create table if not exists removals
+            (input text, type int, uid text, id text, line int,
              text text, temporary_replacement text, output_text text,
              startline int, endline int, se text)"""
         )
+
+        # Indexes for the range queries in select_collectors and
+        # select_sections.
+        c.execute("""
+            create index if not exists collectors_id_line
+            on collectors (id, line)"""
+        )
+
+        c.execute("""
+            create index if not exists sections_id_lines
+            on sections (id, startline, endline)"""
+        )
+
+        # Which sections each collector is inside (see
+        # postprocess.assign_section_collectors), by uid.
+        c.execute("""
+            create table if not exists section_collectors
+            (section text, collector text)"""
+        )
+
+        c.execute("""
+            create index if not exists section_collectors_section
+            on section_collectors (section)"""
+        )
+
+        c.execute("""
+            create index if not exists collectors_uid
+            on collectors (uid)"""
+        )
+
+        # For the collector matches in Database.search.
+        c.execute("""
+            create index if not exists section_collectors_collector
+            on section_collectors (collector)"""
+        )
+
+        # Used by update_table -- for each row of table tab, its key (see
+        # KEY_COLUMNS), the hash of its contents, and its rowid.
+        c.execute("""
+            create table if not exists hashes
+            (tab text, key text, hash text, row int,
+             primary key (tab, key))"""
+        )
                 
         self.conn.commit()
 
@@ -69,6 +175,40 @@ class Database(object):
 
         return
 
+
+    def upgrade_tables(self):
+        """
+        Add any columns that are missing from tables written by older
+        versions (sections.title). These are left empty.
+        """
+
+        columns = [
+            x[1] for x in self.conn.execute("pragma table_info(sections)")
+        ]
+
+        if "title" not in columns:
+            self.conn.execute("alter table sections add column title text")
+            self.conn.commit()
+
+        return
+
+
+    def create_search_table(self):
+        """
+        Create the full-text search table. kind is "section" or
+        "collector", and uid is the uid of that section or collector; only
+        text is indexed.
+        """
+
+        self.conn.execute("""
+            create virtual table if not exists search_text
+            using fts5(kind unindexed, uid unindexed, text)"""
+        )
+
+        self.conn.commit()
+
+        return
+
     
     def insert_collector(self, collector):
         """
@@ -77,7 +217,10 @@ class Database(object):
 
         c = self.conn.cursor()
 
-        c.execute("insert into collectors values (?,?,?,?,?,?,?,?,?)", collector)
+        c.execute(
+            "insert into collectors values (?,?,?,?,?,?,?,?,?)",
+            self.encode("collectors", collector)
+        )
 
         self.conn.commit()
 
@@ -93,7 +236,10 @@ class Database(object):
 
         c = self.conn.cursor()
 
-        c.execute("insert into sections values (?,?,?,?,?,?,?,?,?,?,?,?)", section)
+        c.execute(
+            "insert into sections values (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            self.encode("sections", section)
+        )
 
         self.conn.commit()
 
@@ -109,100 +255,379 @@ class Database(object):
         
         c = self.conn.cursor()
 
-        c.execute("insert into removals values(?,?,?,?,?,?,?,?,?,?,?)", removal)
+        c.execute(
+            "insert into removals values(?,?,?,?,?,?,?,?,?,?,?)",
+            self.encode("removals", removal)
+        )
 
         self.conn.commit()
 
         c.close()
 
+        return
+
+
+    def insert_collectors(self, collectors, commit=True):
+        """
+        Insert many items into the collectors table, in a single transaction.
+        collectors can be any iterable of tuples, including a generator.
+
+        If commit is False, the transaction is left open (so that several
+        tables can be written together) and Database.commit must be called.
+        """
+
+        self.conn.executemany(
+            "insert into collectors values (?,?,?,?,?,?,?,?,?)",
+            (self.encode("collectors", row) for row in collectors)
+        )
+
+        if commit:
+            self.conn.commit()
+
+        return
+
+
+    def insert_sections(self, sections, commit=True):
+        """
+        Insert many items into the sections table, in a single transaction.
+        """
+
+        self.conn.executemany(
+            "insert into sections values (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (self.encode("sections", row) for row in sections)
+        )
+
+        if commit:
+            self.conn.commit()
+
+        return
+
+
+    def insert_removals(self, removals, commit=True):
+        """
+        Insert many removals into the removals table, in a single transaction.
+        """
+
+        self.conn.executemany(
+            "insert into removals values(?,?,?,?,?,?,?,?,?,?,?)",
+            (self.encode("removals", row) for row in removals)
+        )
+
+        if commit:
+            self.conn.commit()
+
+        return
+
     
-    def grab_collectors(self):
+    def insert_section_collectors(self, pairs, commit=True):
         """
-        Grab a list of all collectors as collector objects.
+        Insert many (section uid, collector uid) pairs into the
+        section_collectors table, in a single transaction.
         """
 
-        c = self.conn.cursor()
+        self.conn.executemany(
+            "insert into section_collectors values (?,?)", pairs
+        )
 
-        db_output = c.execute("select * from collectors")
-
-        keys = [
-            "input",
-            "line",
-            "capture",
-            "regex",
-            "uid",
-            "text",
-            "temporary_replacement",
-            "output_text",
-            "id",
-        ]
+        if commit:
+            self.conn.commit()
 
-        collectors = [Collector(dict(zip(keys, values))) for values in db_output]
+        return
 
-        c.close()
 
-        return collectors
+    def insert_search_text(self, rows, commit=True):
+        """
+        Insert many (kind, uid, text) rows into the search_text table, in a
+        single transaction.
+        """
 
+        self.conn.executemany("insert into search_text values (?,?,?)", rows)
 
-    def grab_sections(self):
+        if commit:
+            self.conn.commit()
+
+        return
+
+
+    def update_table(self, table, rows, commit=True):
         """
-        Grab a list of all sections as section objects.
+        Bring one of the collectors, sections, removals, section_collectors
+        or search_text tables in line with rows (an iterable of tuples, in
+        the same form as for the insert_* functions, which is read through
+        once), touching only the rows that have changed.
+
+        Each row is identified by its key (the uid, for the match tables --
+        see KEY_COLUMNS), so a match that has only moved is updated in
+        place. Rows whose contents have not changed are left alone, new
+        rows are inserted, and any other rows are deleted.
+
+        If commit is False, the transaction is left open (so that several
+        tables can be updated together) and Database.commit must be called.
         """
 
+        if table not in KEY_COLUMNS:
+            raise ValueError(f"Cannot update unknown table {table}.")
+
         c = self.conn.cursor()
 
-        db_output = c.execute("select * from sections")
-
-        keys = [
-            "input",
-            "line",
-            "level",
-            "capture",
-            "regex",
-            "uid",
-            "text",
-            "temporary_replacement",
-            "output_text",
-            "startline",
-            "endline",
-            "id",
+        # This removes any rows that were not written by update_table.
+        c.execute(f"""
+            delete from {table} where rowid not in
+            (select row from hashes where tab = ?)
+            """, (table,)
+        )
+
+        existing = {
+            key: (row_hash, row_id) for key, row_hash, row_id in c.execute(
+                "select key, hash, row from hashes where tab = ?", (table,)
+            )
+        }
+
+        columns = [x[1] for x in c.execute(f"pragma table_info({table})")]
+        key_columns = KEY_COLUMNS[table]
+
+        insert = "insert into {} values ({})".format(
+            table, ",".join("?" * len(columns))
+        )
+        update = "update {} set {} where rowid = ?".format(
+            table, ",".join(f"{x} = ?" for x in columns)
+        )
+
+        seen = set()
+
+        for row in rows:
+            key = json.dumps([row[x] for x in key_columns])
+            row_hash = self.hash_row(row)
+
+            seen.add(key)
+
+            try:
+                old_hash, row_id = existing[key]
+            except KeyError:
+                c.execute(insert, self.encode(table, row))
+                row_id = c.lastrowid
+            else:
+                if old_hash == row_hash:
+                    continue
+
+                c.execute(update, (*self.encode(table, row), row_id))
+
+            c.execute(
+                "insert or replace into hashes values (?,?,?,?)",
+                (table, key, row_hash, row_id)
+            )
+
+            existing[key] = (row_hash, row_id)
+
+        stale = [
+            (key, row_id) for key, (_, row_id) in existing.items()
+            if key not in seen
         ]
 
-        sections = [Section(dict(zip(keys, values))) for values in db_output]
+        c.executemany(
+            f"delete from {table} where rowid = ?", ((x,) for _, x in stale)
+        )
+        c.executemany(
+            "delete from hashes where tab = ? and key = ?",
+            ((table, key) for key, _ in stale)
+        )
+
+        if commit:
+            self.conn.commit()
 
         c.close()
 
-        return sections
+        return
 
 
-    def grab_removals(self):
+    def load_types(self):
         """
-        Grab a list of all removals as removal objects.
+        (Re-)reads the generator_types table, which other connections to
+        the same file may have added to since we last read it.
+        """
+
+        self.types.update(
+            self.conn.execute("select key, regex from generator_types")
+        )
+        self.type_keys.update(
+            {regex: key for key, regex in self.types.items()}
+        )
+
+        return
+
+
+    def type_regex(self, key):
+        """
+        Returns the regex for key in the generator_types table, re-reading
+        the table if key was added after we last read it.
+        """
+
+        if not isinstance(key, int):
+            # Rows written before generator_types existed hold the regex.
+            return key
+
+        try:
+            return self.types[key]
+        except KeyError:
+            self.load_types()
+
+            return self.types[key]
+
+
+    def type_key(self, regex):
+        """
+        Returns the key of regex in the generator_types table, adding it if
+        it is not there yet.
+        """
+
+        if regex is None:
+            return None
+
+        try:
+            return self.type_keys[regex]
+        except KeyError:
+            # Another process writing to the same file may have added it
+            # since we read the table.
+            self.conn.execute(
+                "insert or ignore into generator_types (regex) values (?)",
+                (regex,)
+            )
+
+            key, = self.conn.execute(
+                "select key from generator_types where regex = ?", (regex,)
+            ).fetchone()
+
+            self.type_keys[regex] = key
+            self.types[key] = regex
+
+            return key
+
+
+    def encode(self, table, row):
+        """
+        Swap the regex in a packed tuple for its generator_types key.
+        """
+
+        column = REGEX_COLUMN.get(table)
+
+        if column is None:
+            # This table has no regex.
+            return row
+
+        return (
+            *row[:column], self.type_key(row[column]), *row[column + 1:]
+        )
+
+
+    def hash_row(self, row):
+        """
+        Hash of a row's contents, used by update_table.
+        """
+
+        return hashlib.sha1(json.dumps(row).encode("utf-8")).hexdigest()
+
+
+    def generator_cursor(self, generator):
+        """
+        Returns a cursor whose rows come out as objects of type generator
+        (Collector, Section or Removal), built straight from the row tuples.
         """
 
+        column = REGEX_COLUMN[TABLES[generator]]
+        type_regex = self.type_regex
+
+        def factory(cursor, row):
+            regex = type_regex(row[column])
+
+            return generator.from_row(
+                (*row[:column], regex, *row[column + 1:])
+            )
+
         c = self.conn.cursor()
+        c.row_factory = factory
 
-        db_output = c.execute("select * from removals")
-
-        keys = [
-            "input",
-            "regex",
-            "uid",
-            "id",
-            "line",
-            "text",
-            "temporary_replacement",
-            "output_text",
-            "startline",
-            "endline",
-            "se",
-        ]
+        return c
 
-        removals = [Removal(dict(zip(keys, values))) for values in db_output]
 
-        c.close()
+    def iter_table(self, table, generator, batch_size):
+        """
+        Yields every row of table as an object of type generator, fetching
+        batch_size rows from the database at a time.
+        """
 
-        return removals
+        c = self.generator_cursor(generator)
+
+        c.execute(f"select * from {table}")
+
+        try:
+            while True:
+                batch = c.fetchmany(batch_size)
+
+                if not batch:
+                    break
+
+                yield from batch
+        finally:
+            c.close()
+
+        return
+
+
+    def iter_collectors(self, batch_size=256):
+        """
+        Yields all collectors as collector objects, without loading them all
+        into memory at once.
+        """
+
+        yield from self.iter_table("collectors", Collector, batch_size)
+
+        return
+
+
+    def iter_sections(self, batch_size=256):
+        """
+        Yields all sections as section objects, without loading them all
+        into memory at once.
+        """
+
+        yield from self.iter_table("sections", Section, batch_size)
+
+        return
+
+
+    def iter_removals(self, batch_size=256):
+        """
+        Yields all removals as removal objects, without loading them all
+        into memory at once.
+        """
+
+        yield from self.iter_table("removals", Removal, batch_size)
+
+        return
+
+
+    def grab_collectors(self):
+        """
+        Grab a list of all collectors as collector objects.
+        """
+
+        return list(self.iter_collectors())
+
+
+    def grab_sections(self):
+        """
+        Grab a list of all sections as section objects.
+        """
+
+        return list(self.iter_sections())
+
+
+    def grab_removals(self):
+        """
+        Grab a list of all removals as removal objects.
+        """
+
+        return list(self.iter_removals())
 
 
     def select_collectors(self, line_between, id):
@@ -215,26 +640,12 @@ class Database(object):
         id is the 'id' of the collector that you wish to select.
         """
 
-        c = self.conn.cursor()
-
-        db_output = c.execute("""
-            select * from collectors where (line between ? and ?) and
-            id = "?"
-            """, *line_between, id)
-
-        keys = [
-            "input",
-            "line",
-            "capture",
-            "regex",
-            "uid",
-            "text",
-            "temporary_replacement",
-            "output_text",
-            "id",
-        ]
+        c = self.generator_cursor(Collector)
 
-        collectors = [Collector(dict(zip(keys, values))) for values in db_output]
+        collectors = c.execute("""
+            select * from collectors where id = ? and
+            (line between ? and ?)
+            """, (id, *line_between)).fetchall()
 
         c.close()
 
@@ -245,41 +656,118 @@ class Database(object):
         """
         Grab a list of sections as section objects.
 
-        line_between is a 2-length list of integers. Lines are selected
-        between these two ([0] is lower bound, [1] is upper bound).
+        line_between is a 2-length list of integers. Sections that start
+        between these two are selected ([0] is lower bound, [1] is upper
+        bound).
 
-        id is the 'id' of the collector that you wish to select.
+        id is the 'id' of the section that you wish to select.
         """
 
-        c = self.conn.cursor()
-
-        db_output = c.execute("""
-            select * from sections where (line between ? and ?) and
-            id = "?"
-            """, *line_between, id)
-
-        keys = [
-            "input",
-            "line",
-            "level",
-            "capture",
-            "regex",
-            "uid",
-            "text",
-            "temporary_replacement",
-            "output_text",
-            "startline",
-            "endline",
-            "id",
-        ]
+        c = self.generator_cursor(Section)
 
-        sections = [Section(dict(zip(keys, values))) for values in db_output]
+        sections = c.execute("""
+            select * from sections where id = ? and
+            (startline between ? and ?)
+            """, (id, *line_between)).fetchall()
 
         c.close()
 
         return sections
 
 
+    def select_section_collectors(self, section_uid, id=None):
+        """
+        Grab a list of the collectors (as collector objects) that are inside
+        the section with uid section_uid, in the order that they appear.
+
+        If id is given, only collectors with that 'id' are selected.
+        """
+
+        c = self.generator_cursor(Collector)
+
+        query = """
+            select collectors.* from section_collectors
+            join collectors on collectors.uid = section_collectors.collector
+            where section_collectors.section = ?
+            """
+        order = "order by collectors.line, collectors.rowid"
+
+        if id is None:
+            c.execute(f"{query} {order}", (section_uid,))
+        else:
+            c.execute(
+                f"{query} and collectors.id = ? {order}", (section_uid, id)
+            )
+
+        collectors = c.fetchall()
+
+        c.close()
+
+        return collectors
+
+
+    def search(self, query, limit=20):
+        """
+        Full-text search over the sections and collectors (see the FTS5
+        documentation for the form of query). Matches in a collector count
+        as matches in the sections that it is inside.
+
+        Returns a list of up to limit (section uid, snippet) pairs, best
+        match first, with each section only once (with the snippet of its
+        best match). The snippets are HTML: the text is escaped, and the
+        matching words are in <b></b>.
+        """
+
+        if not self.searchable:
+            raise ValueError("This database has no search table.")
+
+        # snippet marks the matches with these, so that we can escape the
+        # rest of the text before swapping them for tags.
+        start, end = "\x02", "\x03"
+
+        c = self.conn.execute("""
+            select
+                coalesce(section_collectors.section, search_text.uid),
+                snippet(search_text, 2, ?, ?, '...', 16)
+            from search_text
+            left join section_collectors
+                on search_text.kind = 'collector'
+                and section_collectors.collector = search_text.uid
+            where search_text match ?
+                and (search_text.kind = 'section'
+                     or section_collectors.section is not null)
+            order by rank
+            """, (start, end, query)
+        )
+
+        results = {}
+
+        # A section can match through its own text and its collectors, so
+        # we keep the first (best) match for each one.
+        for section, snippet in c:
+            if section in results:
+                continue
+
+            results[section] = html.escape(snippet)\
+                .replace(start, "<b>").replace(end, "</b>")
+
+            if len(results) == limit:
+                break
+
+        c.close()
+
+        return list(results.items())
+
+
+    def commit(self):
+        """
+        Commits the current transaction.
+        """
+        self.conn.commit()
+
+        return
+
+
     def close_connection(self):
         """
         Closes the connection.
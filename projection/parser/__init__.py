@@ -1,6 +1,10 @@
 from projection.parser import \
     objects,\
+    matcher,\
+    cache,\
+    source,\
     generators,\
     postprocess,\
+    arrays,\
     config
 
@@ -0,0 +1,241 @@
+"""
+An array-backed version of the postprocessing, for documents with a very
+large number of matches (e.g. generated problem sets with 100k+ collectors).
+
+The line numbers, types and ids of the matches are kept in NumPy arrays,
+and the section spans and the sections that each collector is inside are
+worked out with diff and searchsorted rather than one object at a time. The
+results are written back to the same Section and Collector objects.
+
+NumPy is optional -- check arrays.available before using this (Config
+does this for you if you ask for vectorized=True).
+"""
+
+from .generators import Section, Collector, Removal
+from .objects import Parser, Generator
+from .postprocess import pair_removals
+
+from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+available = np is not None
+
+# The codes used for each type of match in MatchArrays.kinds.
+SECTION = 0
+COLLECTOR = 1
+REMOVAL = 2
+
+KINDS = {
+    Section: SECTION,
+    Collector: COLLECTOR,
+    Removal: REMOVAL,
+}
+
+
+class MatchArrays(object):
+    """
+    The matches of a parser as arrays, in line order:
+
+        + objects, the list of match objects,
+        + lines, their line numbers,
+        + kinds, their types (SECTION, COLLECTOR or REMOVAL),
+        + ids, a code for their id (id_names[code] gives the id back).
+    """
+    def __init__(self, matches):
+        if not available:
+            raise ImportError("NumPy is needed for arrays.MatchArrays.")
+
+        count = len(matches)
+        codes = {}
+
+        self.objects = list(matches.values())
+        self.lines = np.fromiter(matches.keys(), dtype=np.int64, count=count)
+        self.kinds = np.fromiter(
+            (KINDS[type(x)] for x in self.objects), dtype=np.int8, count=count
+        )
+        self.ids = np.fromiter(
+            (codes.setdefault(x.id, len(codes)) for x in self.objects),
+            dtype=np.int64,
+            count=count
+        )
+        self.id_names = list(codes)
+
+        # {length: section_spans(length)}, as they are needed twice.
+        self.spans = {}
+
+        # dicts keep their insertion order, not line order.
+        order = np.argsort(self.lines, kind="stable")
+
+        if count and np.any(np.diff(order) != 1):
+            self.objects = [self.objects[x] for x in order]
+            self.lines = self.lines[order]
+            self.kinds = self.kinds[order]
+            self.ids = self.ids[order]
+
+        return
+
+
+    def section_spans(self, length):
+        """
+        Works out where each section starts and ends. A section runs until
+        the next section with the same id, or the end of the text (length).
+
+        Returns (indices, startlines, endlines), sorted by id and then line,
+        where indices are positions in MatchArrays.objects. These are only
+        worked out once for each length.
+        """
+
+        if length in self.spans:
+            return self.spans[length]
+
+        indices = np.flatnonzero(self.kinds == SECTION)
+        indices = indices[np.lexsort((self.lines[indices], self.ids[indices]))]
+
+        startlines = self.lines[indices]
+        endlines = np.full_like(startlines, length)
+
+        # Each section ends where the next one starts, unless the next one
+        # has a different id.
+        same_id = np.diff(self.ids[indices]) == 0
+        endlines[:-1][same_id] = startlines[1:][same_id]
+
+        self.spans[length] = indices, startlines, endlines
+
+        return self.spans[length]
+
+
+    def collector_sections(self, indices, startlines, endlines):
+        """
+        Works out which sections (given as by MatchArrays.section_spans)
+        each collector is inside.
+
+        Returns (section indices, collector indices) as two arrays of
+        positions in MatchArrays.objects.
+        """
+
+        collectors = np.flatnonzero(self.kinds == COLLECTOR)
+        lines = self.lines[collectors]
+
+        ids = self.ids[indices]
+        groups = np.flatnonzero(np.diff(ids)) + 1
+        group_starts = np.concatenate(([0], groups))
+        group_ends = np.concatenate((groups, [len(ids)]))
+
+        found_sections = []
+        found_collectors = []
+
+        # The sections with one id don't overlap, so each collector is in
+        # at most one of them.
+        for start, end in zip(group_starts, group_ends):
+            if start == end:
+                continue
+
+            position = np.searchsorted(
+                startlines[start:end], lines, side="right"
+            ) - 1
+
+            inside = position >= 0
+            inside[inside] = \
+                lines[inside] < endlines[start:end][position[inside]]
+
+            found_sections.append(indices[start:end][position[inside]])
+            found_collectors.append(collectors[inside])
+
+        if not found_sections:
+            empty = np.empty(0, dtype=np.int64)
+
+            return empty, empty
+
+        return np.concatenate(found_sections), np.concatenate(found_collectors)
+
+
+def prepare(parser: Parser) -> MatchArrays:
+    """
+    Pairs up the parser's removals (which deletes the removal-end objects)
+    and builds the MatchArrays for the matches that are left. This can be
+    passed to both assign_all and assign_section_collectors, so that the
+    arrays are only built (and sorted) once.
+    """
+
+    # Removals come in start/end pairs, and are few, so they are paired up
+    # in the same way as in postprocess.assign_all (this also deletes the
+    # removal-end objects).
+    pair_removals(parser, sorted(
+        (
+            (line, match) for line, match in parser.matches.items()
+            if isinstance(match, Removal)
+        ),
+        key=lambda x: x[0]
+    ))
+
+    return MatchArrays(parser.matches)
+
+
+def assign_all(
+        parser: Parser,
+        arrays: MatchArrays = None
+    ) -> Dict[Tuple[type, Any], List[Generator]]:
+    """
+    Does the same as postprocess.assign_all, with the section spans worked
+    out on arrays. arrays is the output of prepare(parser), which is called
+    if it is not given.
+
+    Returns a dictionary of {(type, id): list of matches} and _also_
+    modifies the parser object.
+    """
+
+    if arrays is None:
+        arrays = prepare(parser)
+
+    for match, line in zip(arrays.objects, arrays.lines.tolist()):
+        match.line = line
+
+    indices, startlines, endlines = arrays.section_spans(len(parser.text))
+
+    for index, startline, endline in zip(
+            indices.tolist(), startlines.tolist(), endlines.tolist()
+        ):
+        section = arrays.objects[index]
+        section.startline = startline
+        section.endline = endline
+        section.view(parser.text)
+
+    buckets = {}
+
+    for match in arrays.objects:
+        buckets.setdefault((type(match), match.id), []).append(match)
+
+    return buckets
+
+
+def assign_section_collectors(
+        parser: Parser,
+        arrays: MatchArrays = None
+    ) -> List[Tuple[str, str]]:
+    """
+    Does the same as postprocess.assign_section_collectors, for all of the
+    parser's matches (once their line numbers have been assigned), with
+    arrays. If the MatchArrays that was given to assign_all is passed as
+    arrays, it is re-used rather than built again.
+
+    Returns a list of (section uid, collector uid) pairs.
+    """
+
+    if arrays is None:
+        arrays = MatchArrays(parser.matches)
+
+    sections, collectors = arrays.collector_sections(
+        *arrays.section_spans(len(parser.text))
+    )
+
+    objects = arrays.objects
+
+    return [
+        (objects[section].uid, objects[collector].uid)
+        for section, collector in zip(sections.tolist(), collectors.tolist())
+    ]
@@ -0,0 +1,145 @@
+"""
+Contains the PandocCache object. This is an on-disk cache of the output of
+objects.convert(), so that text that has not changed since the last run
+does not have to go through pandoc again.
+"""
+
+import hashlib
+import json
+import os
+
+import pypandoc
+
+
+class PandocCache(object):
+    """
+    Content-addressed cache of pandoc output.
+
+    Entries are keyed by a hash of the text that is sent through ltmd, the
+    image prefix and extra arguments given to pandoc, and the version of
+    pandoc itself. Each entry is a file in directory; once the files take up
+    more than max_size bytes, the least recently used ones are removed until
+    they take up no more than low_water (a fraction of max_size), so that
+    we don't have to evict again on every following put.
+
+    Entries are written atomically, so the same directory can be shared by
+    several processes.
+    """
+    def __init__(self, directory, max_size=256 * 1024 * 1024, low_water=0.75):
+        self.directory = directory
+        self.max_size = max_size
+        self.low_water = low_water
+        self.version = pypandoc.get_pandoc_version()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.size = sum(entry.stat().st_size for entry in self.entries())
+
+        return
+
+
+    def entries(self):
+        """
+        Returns a list of os.DirEntry objects, one per cached item.
+        """
+
+        with os.scandir(self.directory) as iterator:
+            return [
+                entry for entry in iterator
+                if entry.is_file() and entry.name.endswith(".md")
+            ]
+
+
+    def key(self, text, image_prepend, extra):
+        """
+        Returns the key (a hex digest) for a given pandoc run.
+        """
+
+        description = json.dumps([self.version, image_prepend, extra, text])
+
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+    def path(self, key):
+        """
+        Returns the filename that the item with this key is stored in.
+        """
+
+        return os.path.join(self.directory, f"{key}.md")
+
+
+    def get(self, key):
+        """
+        Returns the cached output for key, or None if we don't have it.
+        """
+
+        path = self.path(key)
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                output = file.read()
+
+            # Mark this entry as recently used.
+            os.utime(path)
+        except FileNotFoundError:
+            # Not cached, or evicted by another process.
+            return None
+
+        return output
+
+
+    def put(self, key, output):
+        """
+        Stores output under key, and evicts old entries if required.
+        """
+
+        path = self.path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(output)
+
+        self.size += os.path.getsize(temporary_path)
+
+        try:
+            # We are replacing an entry, so don't count it twice.
+            self.size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+
+        os.replace(temporary_path, path)
+
+        if self.size > self.max_size:
+            self.evict()
+
+        return
+
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        low_water * max_size.
+        """
+
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in self.entries()
+        )
+
+        self.size = sum(size for _, size, _ in entries)
+
+        target = self.low_water * self.max_size
+
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process got there first.
+                pass
+
+            self.size -= size
+
+        return
@@ -8,36 +8,161 @@ Contains the configuration object. This object:
 
 
 from ..io import Database
+from .cache import PandocCache
 from .generators import Collector, Section, Removal
 from .objects import Parser
-from .postprocess import \
-    assign_section_line_numbers, \
-    assign_section_text, \
-    assign_collector_line_numbers, \
-    assign_removal_line_numbers, \
-    assign_removal_text
+from .source import TexSource, MappedTexSource
+from .postprocess import assign_all, assign_section_collectors
+from . import arrays
 
 
+import functools
 import yaml
 import re
+import os
+
+
+# HTML comments, which are left out of the search table.
+COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+def stage(function):
+    """
+    Makes a Config method into a stage of the pipeline. A stage first runs
+    the stage before it (in Config.stages), then itself, unless it has
+    already been run or skipped. It returns the Config, so that stages can
+    be chained.
+    """
+
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapped(self):
+        index = self.stages.index(name)
+
+        if index:
+            getattr(self, self.stages[index - 1])()
+
+        if name not in self.done:
+            function(self)
+            self.done.add(name)
+
+        return self
+
+    return wrapped
 
 
 class Config(object):
     """
     Main configuration object.
 
+    The work is split into stages, each of which runs the stages before it
+    if they have not been run yet:
+
+        + Config.load, which reads the configuration file and makes the
+          generators,
+        + Config.match, which finds the matches in the .tex file,
+        + Config.convert, which sends the text through pandoc,
+        + Config.postprocess, which works out the text of each section
+          (and so on),
+        + Config.persist, which writes everything to the database.
+
+    Unless run is False, all of them are run when the Config is made. A
+    stage can be skipped with Config.skip -- for instance, skipping convert
+    and then persisting writes the matches without running pandoc.
+
     To access the final output text, you will need to use
 
         Config.parser.text,
 
-    as Config.text_data is the line-by-like data.
+    as Config.text_data is the line-by-like data (a source.TexSource, which
+    also reads any files that are \\input{} or \\include{}d).
+
+    If incremental is True, we avoid some of the work that has not changed
+    since the last incremental run:
+
+        + The output of pandoc is cached on disk, in the directory given
+          by meta: cache in the configuration file (this defaults to the
+          database filename with .cache appended). By default the whole
+          document is one cache entry, so pandoc is only skipped if nothing
+          has changed. If processes is also given, the document is
+          converted (and cached) in chunks, one per section, so that only
+          the sections that have changed go through pandoc again.
+        + Only the rows in the database that have changed are written (see
+          Database.update_table).
+
+    The document is still read, matched and postprocessed in full.
+
+    If mapped is True, the .tex file is memory-mapped (see
+    source.MappedTexSource) rather than read in, which is useful for very
+    large files. In this case, \\input{} and \\include{} are not expanded.
+
+    cache is the directory for the pandoc cache (or a cache.PandocCache
+    that is already open). If it is given, the cache is used even if
+    incremental is False, and it overrides meta: cache.
+
+    If processes is given, the document is split into chunks at each
+    section, and the chunks are converted by that many pandoc processes (see
+    Parser). This is off by default, as it is only safe if no environment in
+    the document body is left open across a section.
+
+    database is an io.Database that is already open, to write to instead of
+    meta: database. It is left open afterwards.
+
+    If vectorized is True, the postprocessing is done on arrays (see
+    arrays.py), which is much faster for documents with very many matches.
+    This needs NumPy.
     """
-    def __init__(self, tex_filename, config_filename):
-        with open(config_filename, "r") as file:
-            self.raw_data = yaml.load(file)
 
-        with open(tex_filename, "r") as file:
-            self.text_data = file.readlines()
+    # The stages, in order.
+    stages = ["load", "match", "convert", "postprocess", "persist"]
+
+    def __init__(self, tex_filename, config_filename, incremental=False,
+            mapped=False, cache=None, processes=None, database=None,
+            vectorized=False, run=True):
+        if vectorized and not arrays.available:
+            raise ImportError("NumPy is needed for vectorized=True.")
+
+        self.tex_filename = tex_filename
+        self.config_filename = config_filename
+        self.incremental = incremental
+        self.mapped = mapped
+        self.cache = cache
+        self.processes = processes
+        self.database = database
+        self.vectorized = vectorized
+
+        # The stages that have been run (or skipped).
+        self.done = set()
+
+        if run:
+            self.persist()
+
+        return
+
+
+    def skip(self, name):
+        """
+        Skip the stage called name, so that it is not run by the stages
+        after it.
+        """
+
+        if name not in self.stages:
+            raise ValueError(f"Unknown stage {name}.")
+
+        self.done.add(name)
+
+        return self
+
+
+    @stage
+    def load(self):
+        """
+        Read the configuration file and make the generators.
+        """
+
+        with open(self.config_filename, "r") as file:
+            self.raw_data = yaml.safe_load(file)
 
         self.generators = {}
 
@@ -45,11 +170,80 @@ class Config(object):
         self.get_collectors()
         self.get_removals()
 
-        self.parser = Parser(self.text_data, self.generators)
+        return
+
+
+    @stage
+    def match(self):
+        """
+        Find the matches in the .tex file (see Parser.run_matching).
+        """
+
+        if self.mapped:
+            self.text_data = MappedTexSource(self.tex_filename)
+        else:
+            self.text_data = TexSource(self.tex_filename)
+
+        self.parser = Parser(
+            self.text_data,
+            self.generators,
+            processes=self.processes,
+            run=False,
+            document=os.path.abspath(self.tex_filename)
+        )
+
+        self.parser.run_matching()
+
+        return
+
+
+    @stage
+    def convert(self):
+        """
+        Send the text through pandoc (see Parser.run_conversion), using
+        the pandoc cache if we have one. The cache is only opened here, as
+        it runs pandoc (for its version) and creates its directory.
+        """
+
+        if self.incremental or self.cache is not None:
+            self.parser.cache = self.get_cache(self.cache)
+
+        self.parser.run_conversion()
+
+        return
+
+
+    @stage
+    def postprocess(self):
+        """
+        Run the postprocessing (see postprocessing_run).
+        """
+
         self.postprocessing_run()
-        
-        self.db = Database(self.raw_data["meta"]["database"])
-        self.write_to_db()
+
+        return
+
+
+    @stage
+    def persist(self):
+        """
+        Write everything to the database.
+        """
+
+        if self.database is None:
+            meta = self.raw_data["meta"]
+
+            self.db = Database(
+                meta["database"], search=meta.get("search", False)
+            )
+        else:
+            self.db = self.database
+
+        if self.incremental:
+            self.update_db()
+        else:
+            self.write_to_db()
+
         del self.db
 
         return
@@ -61,9 +255,12 @@ class Config(object):
 
         We have to do this because otherwise we run into problems with
         late binding.
+
+        The returned function takes the input line, and passes on any other
+        keyword arguments (the match object and uid from the Parser).
         """
-        def f(input):
-            return Section(input, **kwargs)
+        def f(input, **extra):
+            return Section(input, **kwargs, **extra)
 
         return f
 
@@ -72,8 +269,8 @@ class Config(object):
         """
         Make a collector object!
         """
-        def f(input):
-            return Collector(input, **kwargs)
+        def f(input, **extra):
+            return Collector(input, **kwargs, **extra)
 
         return f
 
@@ -82,8 +279,8 @@ class Config(object):
         """
         Make a removal object!
         """
-        def f(input):
-            return Removal(input, **kwargs)
+        def f(input, **extra):
+            return Removal(input, **kwargs, **extra)
 
         return f
 
@@ -117,14 +314,14 @@ class Config(object):
         """
 
         for collector in self.raw_data["collectors"]:
-            regex = r"%%\\{:s}\{{.*?\}}".format(collector["syntax"])
+            regex = r"%%\\{:s}\{{(.*?)\}}".format(collector["syntax"])
         
             compiled = re.compile(regex, re.VERBOSE)
 
             arguments = {
                 "regex": regex,
                 "id": collector["name"],
-                "capture": 0
+                "capture": 1
             }
 
             self.generators[compiled] = self.make_collector(arguments)
@@ -154,39 +351,153 @@ class Config(object):
         return
 
 
+    def get_cache(self, directory=None):
+        """
+        Get the pandoc cache used for incremental runs.
+        """
+
+        if isinstance(directory, PandocCache):
+            return directory
+
+        if directory is None:
+            directory = self.cache_directory()
+
+        return PandocCache(directory)
+
+
+    def cache_directory(self):
+        """
+        The directory given by meta: cache (or its default).
+        """
+
+        meta = self.raw_data["meta"]
+
+        return meta.get("cache", f"{meta['database']}.cache")
+
+
     def postprocessing_run(self):
         """
-        Run all of the postprocessing functions.
+        Run all of the postprocessing functions. This is done for every
+        section, collector and removal in one pass over the matches (or on
+        arrays, if vectorized -- these are kept as Config.match_arrays for
+        Config.section_collectors).
         """
-        
-        for section in self.raw_data["sections"]:
-            assign_section_line_numbers(self.parser, id=section["name"])
-            assign_section_text(self.parser, id=section["name"])
 
-        for collector in self.raw_data["collectors"]:
-            assign_collector_line_numbers(self.parser, id=collector["name"])
+        if self.vectorized:
+            self.match_arrays = arrays.prepare(self.parser)
+            arrays.assign_all(self.parser, self.match_arrays)
+        else:
+            assign_all(self.parser)
 
-        for removal in self.raw_data["removals"]:
-            assign_removal_line_numbers(self.parser, id=removal["name"])
-            assign_removal_text(self.parser, id=removal["name"])
+        return
+
+
+    def rows(self):
+        """
+        Pack our matches, grouped by the database table that they belong in.
+
+        Returns a dictionary of {table: generator of tuples}. The matches are
+        only packed (and so the text of each section only built) as the rows
+        are written. The section_collectors table gets the (section uid,
+        collector uid) pairs from postprocess.assign_section_collectors, and
+        if the database has a search table, it gets the text of each section
+        and collector.
+        """
+
+        rows = {
+            "collectors": self.packed(Collector),
+            "sections": self.packed(Section),
+            "removals": self.packed(Removal),
+            "section_collectors": self.section_collectors(),
+        }
+
+        if self.db.searchable:
+            rows["search_text"] = self.search_text()
+
+        return rows
+
+
+    def packed(self, generator):
+        """
+        Yields the packed tuple for each of our matches of type generator.
+        """
+
+        for match in self.parser.matches.values():
+            if isinstance(match, generator):
+                yield match.pack_tuple()
 
         return
 
 
-    def write_to_db(self):
+    def section_collectors(self):
         """
-        Write sections and collectors to database.
+        Returns the (section uid, collector uid) pairs for every collector
+        and the sections that it is inside.
+        """
+
+        if self.vectorized:
+            # The arrays from postprocessing_run, unless it was skipped.
+            return arrays.assign_section_collectors(
+                self.parser, getattr(self, "match_arrays", None)
+            )
+
+        matches = self.parser.matches.values()
+
+        return assign_section_collectors(
+            [x for x in matches if isinstance(x, Section)],
+            [x for x in matches if isinstance(x, Collector)]
+        )
+
+
+    def search_text(self):
+        """
+        Yields a (kind, uid, text) row for the search table for each of our
+        sections and collectors. HTML comments (the collector placeholders,
+        and the text of removals) are taken out of the section text, as they
+        are not shown.
         """
 
         for match in self.parser.matches.values():
-            if isinstance(match, Collector):
-                self.db.insert_collector(tuple(match.pack().values()))
-            elif isinstance(match, Section):
-                self.db.insert_section(tuple(match.pack().values()))
-            elif isinstance(match, Removal):
-                self.db.insert_removal(tuple(match.pack().values()))
-            else:
-                continue
+            if isinstance(match, Section):
+                yield ("section", match.uid, COMMENT.sub("", match.text))
+            elif isinstance(match, Collector):
+                yield ("collector", match.uid, match.text)
 
         return
 
+
+    def write_to_db(self):
+        """
+        Write sections and collectors to database, in a single transaction.
+        """
+
+        rows = self.rows()
+
+        self.db.insert_collectors(rows["collectors"], commit=False)
+        self.db.insert_sections(rows["sections"], commit=False)
+        self.db.insert_removals(rows["removals"], commit=False)
+        self.db.insert_section_collectors(
+            rows["section_collectors"], commit=False
+        )
+
+        if "search_text" in rows:
+            self.db.insert_search_text(rows["search_text"], commit=False)
+
+        self.db.commit()
+
+        return
+
+
+    def update_db(self):
+        """
+        Bring the database in line with our sections and collectors, only
+        writing the rows that have changed since the last incremental run,
+        in a single transaction.
+        """
+
+        for table, table_rows in self.rows().items():
+            self.db.update_table(table, table_rows, commit=False)
+
+        self.db.commit()
+
+        return
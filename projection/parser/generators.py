@@ -8,10 +8,9 @@ Holds the three main generators objects,
 that all inherit from .objects.Generator.
 """
 
-import uuid
 import re
 
-from .objects import Generator
+from .objects import Generator, make_uid
 
 
 class Collector(Generator):
@@ -32,7 +31,20 @@ class Collector(Generator):
     id is a unique identifier for this _type_ of collector (for example, the
     string 'Keypoint' for a keypoint).
     """
-    def __init__(self, input, regex=None, id=None, line=None, capture=0):
+    __slots__ = (
+        "input",
+        "line",
+        "capture",
+        "regex",
+        "uid",
+        "text",
+        "temporary_replacement",
+        "output_text",
+        "id",
+    )
+
+    def __init__(self, input, regex=None, id=None, line=None, capture=0,
+            match=None, uid=None):
         if regex is None and not isinstance(input, dict):
             raise ValueError(
                 "Please supply a string or compiled pattern to the regex\
@@ -42,25 +54,31 @@ class Collector(Generator):
         self.regex = regex
         self.id = id
         self.line = line
+        self.uid = uid
         self.capture = capture
 
         # This calls Collector.parse()
-        super(Collector, self).__init__(input)
+        super(Collector, self).__init__(input, match)
 
         return
 
 
-    def parse(self):
+    def parse(self, match=None):
         """
-        Use the regex to parse the information!
+        Use the regex to parse the information! If the Parser has already
+        found the match, we re-use it rather than searching again.
 
         This sets:
-            uid, temporary_replacement, output_text.
+            uid (unless it was given), temporary_replacement, output_text.
         """
         
-        self.uid = str(uuid.uuid4())
+        if self.uid is None:
+            self.uid = make_uid(self.input)
+
+        if match is None:
+            match = re.search(self.regex, self.input)
 
-        self.text = re.search(self.regex, self.input)[self.capture]
+        self.text = match[self.capture]
 
         self.temporary_replacement = self.uid
 
@@ -120,6 +138,25 @@ class Collector(Generator):
         return packed
 
 
+    def pack_tuple(self):
+        """
+        Packs the object's contents in a tuple, in the same order as pack.
+        This is what we write to the database.
+        """
+
+        return (
+            self.input,
+            self.line,
+            self.capture,
+            self.regex,
+            self.uid,
+            self.text,
+            self.temporary_replacement,
+            self.output_text,
+            self.id,
+        )
+
+
 class Section(Generator):
     """
     General sectioning class.
@@ -133,8 +170,34 @@ class Section(Generator):
         ##### Heading
 
     etc.
+
+    Once the section knows its startline and endline, its text can be a view
+    onto a list of lines that is shared with other sections (see
+    Section.view), rather than its own copy. The string is only built when
+    Section.text is read.
+
+    The text that the regex captured (the name of the section) is kept as
+    Section.title, as the text is replaced by the section's contents.
     """
-    def __init__(self, input, regex=None, id=None, line=None, capture=0, level=1):
+    __slots__ = (
+        "input",
+        "line",
+        "level",
+        "capture",
+        "regex",
+        "uid",
+        "_text",
+        "temporary_replacement",
+        "output_text",
+        "startline",
+        "endline",
+        "id",
+        "title",
+        "buffer",
+    )
+
+    def __init__(self, input, regex=None, id=None, line=None, capture=0, level=1,
+            match=None, uid=None):
         if regex is None and not isinstance(input, dict):
             raise ValueError(
                 "Please supply a string or compiled pattern to the regex\
@@ -144,29 +207,38 @@ class Section(Generator):
         self.regex = regex
         self.id = id
         self.line = line
+        self.uid = uid
         self.level = level
         self.capture = capture
 
         self.startline = None
         self.endline = None
+        self.buffer = None
 
         # This calls Section.parse()
-        super(Section, self).__init__(input)
+        super(Section, self).__init__(input, match)
 
         return
 
 
-    def parse(self):
+    def parse(self, match=None):
         """
-        Use the regex to parse the information!
+        Use the regex to parse the information! If the Parser has already
+        found the match, we re-use it rather than searching again.
 
         This sets:
-            uid, temporary_replacement, output_text.
+            uid (unless it was given), temporary_replacement, output_text,
+            title.
         """
         
-        self.uid = str(uuid.uuid4())
+        if self.uid is None:
+            self.uid = make_uid(self.input)
 
-        self.text = re.search(self.regex, self.input)[self.capture]
+        if match is None:
+            match = re.search(self.regex, self.input)
+
+        self.text = match[self.capture]
+        self.title = self.text
 
         self.temporary_replacement = self.uid
 
@@ -178,6 +250,37 @@ class Section(Generator):
         return
 
 
+    @property
+    def text(self):
+        """
+        The text of the section. If this is a view onto a buffer, the string
+        is built from the lines between startline and endline.
+        """
+
+        if self.buffer is None:
+            return self._text
+        else:
+            return "\n".join(self.buffer[self.startline:self.endline])
+
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self.buffer = None
+
+
+    def view(self, buffer):
+        """
+        Make the text of this section a view onto buffer (a list of lines,
+        usually Parser.text), between startline and endline. The buffer is
+        shared, not copied, so it should not be changed afterwards.
+        """
+
+        self.buffer = buffer
+
+        return
+
+
     def unpack(
             self,
             input,
@@ -191,7 +294,8 @@ class Section(Generator):
             output_text,
             startline,
             endline,
-            id
+            id,
+            title=None
         ):
         """
         Unpacks a dictionary used to temporarily store the object contents.
@@ -209,6 +313,7 @@ class Section(Generator):
         self.startline = startline
         self.endline = endline
         self.id = id
+        self.title = title
 
 
         return
@@ -234,10 +339,34 @@ class Section(Generator):
         packed["startline"] = self.startline
         packed["endline"] = self.endline
         packed["id"] = self.id
+        packed["title"] = self.title
 
         return packed
 
 
+    def pack_tuple(self):
+        """
+        Packs the object's contents in a tuple, in the same order as pack.
+        This is what we write to the database.
+        """
+
+        return (
+            self.input,
+            self.line,
+            self.level,
+            self.capture,
+            self.regex,
+            self.uid,
+            self.text,
+            self.temporary_replacement,
+            self.output_text,
+            self.startline,
+            self.endline,
+            self.id,
+            self.title,
+        )
+
+
 class Removal(Generator):
     """
     Removal object.
@@ -247,7 +376,22 @@ class Removal(Generator):
     In postprocessing, we'll remove the 'end' ones once we have assigned
     the text to be removed. Start/end is denoted by se=s or e.
     """
-    def __init__(self, input, regex=None, id=None, line=None, se=None):
+    __slots__ = (
+        "input",
+        "regex",
+        "uid",
+        "id",
+        "line",
+        "text",
+        "temporary_replacement",
+        "output_text",
+        "startline",
+        "endline",
+        "se",
+    )
+
+    def __init__(self, input, regex=None, id=None, line=None, se=None,
+            match=None, uid=None):
         if regex is None and not isinstance(input, dict):
             raise ValueError(
                 "Please supply a string or compiled pattern to the regex\
@@ -257,6 +401,7 @@ class Removal(Generator):
         self.regex = regex
         self.id = id
         self.line = line
+        self.uid = uid
         self.text = ""
         self.se = se
 
@@ -264,19 +409,20 @@ class Removal(Generator):
         self.endline = None
 
         # This calls Removal.parse() -- which we don't actually care about
-        super(Removal, self).__init__(input)
+        super(Removal, self).__init__(input, match)
 
         return
 
 
-    def parse(self):
+    def parse(self, match=None):
         """
         Parse the line -- all we need to do here is stick a HTML comment.
         This sets:
-            uid, temporary_replacement, output_text.
+            uid (unless it was given), temporary_replacement, output_text.
         """
         
-        self.uid = str(uuid.uuid4())
+        if self.uid is None:
+            self.uid = make_uid(self.input)
 
         self.temporary_replacement = self.uid
 
@@ -312,6 +458,26 @@ class Removal(Generator):
         return packed
 
 
+    def pack_tuple(self):
+        """
+        Pack to a tuple, in the same order as pack, for the database.
+        """
+
+        return (
+            self.input,
+            self.regex,
+            self.uid,
+            self.id,
+            self.line,
+            self.text,
+            self.temporary_replacement,
+            self.output_text,
+            self.startline,
+            self.endline,
+            self.se,
+        )
+
+
     def unpack(
             self,
             input,
@@ -338,7 +504,7 @@ class Removal(Generator):
         self.text = text
         self.temporary_replacement = temporary_replacement
         self.output_text = output_text
-        self.startline = regex
+        self.startline = startline
         self.endline = endline
         self.se = se
 
@@ -0,0 +1,224 @@
+"""
+Contains the Matcher object. This combines all of the compiled expressions
+in a generators dictionary into a single alternation, so that each line of
+the document is only scanned once, rather than once per custom syntax.
+"""
+
+import re
+import os
+
+
+# Flags that can be applied to a single group with the (?flags:...) syntax.
+SCOPED_FLAGS = {
+    re.ASCII: "a",
+    re.IGNORECASE: "i",
+    re.MULTILINE: "m",
+    re.DOTALL: "s",
+    re.VERBOSE: "x",
+}
+
+# Characters that end the literal prefix of an expression.
+SPECIAL_CHARACTERS = ".^$*+?{}[]()|"
+
+# A brace that starts a repeat, like {2} or {1,3}, rather than a literal.
+REPEAT = re.compile(r"\{\d*,?\d*\}")
+
+# References to other groups in an expression (\1, (?P=name) or a
+# conditional (?(1)...)), which wrapping the expression would break.
+REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*(?:\\\d|\(\?P=|\(\?\()")
+
+
+def literal_prefix(expression):
+    r"""
+    Returns the literal string that every match of the compiled expression
+    must start with (for example, r"%%\\section{(.*?)}" gives "%%\section").
+
+    This is conservative -- if we are not sure, we stop early, and an empty
+    string means that we could not find a prefix at all.
+    """
+
+    pattern = expression.pattern
+
+    if expression.flags & re.IGNORECASE or "|" in pattern:
+        return ""
+
+    verbose = expression.flags & re.VERBOSE
+    prefix = []
+    position = 0
+
+    while position < len(pattern):
+        character = pattern[position]
+
+        if character == "\\":
+            escaped = pattern[position + 1:position + 2]
+
+            if not escaped or escaped.isalnum():
+                # Character classes (\d, \w, ...) and back-references.
+                break
+
+            literal = escaped
+            step = 2
+        elif character in SPECIAL_CHARACTERS:
+            break
+        elif verbose and (character.isspace() or character == "#"):
+            break
+        else:
+            literal = character
+            step = 1
+
+        following = pattern[position + step:position + step + 1]
+        repeat = REPEAT.match(pattern, position + step)
+
+        if following in ("*", "?") or (repeat and repeat.group() != "{}"):
+            # The literal is optional, so it can't be part of the prefix.
+            break
+
+        if verbose and (following.isspace() or following == "#"):
+            # A repeat could follow the whitespace, so we can't be sure.
+            break
+
+        prefix.append(literal)
+        position += step
+
+        if following == "+":
+            break
+
+    return "".join(prefix)
+
+
+class Matcher(object):
+    """
+    Combined matcher for a generators dictionary of the form
+
+        {compiled_expression: generator},
+
+    as used by the Parser.
+
+    Each expression is wrapped in its own named group,
+
+        (?P<_0>...)|(?P<_1>...)|...
+
+    and the name of the group that matched tells us which generator to
+    dispatch to. Note that the leftmost match in the line wins; if two
+    expressions match at the same position, the first one in the
+    generators dictionary is used.
+
+    Lines are prefiltered with the literal prefix that is shared by all of
+    the expressions (for our custom syntax, this is %%\\), so only the few
+    lines that could contain custom syntax reach the regex engine.
+
+    If the expressions cannot be combined (for example, two of them define
+    a named group with the same name, or one refers back to its own groups,
+    whose numbers would change) we fall back to trying each one in turn.
+    """
+    def __init__(self, generators):
+        self.generators = generators
+        self.groups = {}
+
+        alternatives = []
+
+        for number, (expression, generator) in enumerate(generators.items()):
+            name = f"_{number}"
+
+            self.groups[name] = (expression, generator)
+            alternatives.append(f"(?P<{name}>{self.scope(expression)})")
+
+        prefixes = [literal_prefix(expression) for expression in generators]
+        self.prefix = os.path.commonprefix(prefixes)
+
+        try:
+            # An empty alternation would match every line.
+            self.combined = re.compile("|".join(alternatives)) \
+                if alternatives else None
+        except re.error:
+            self.combined = None
+
+        if any(REFERENCE.search(x.pattern) for x in generators):
+            self.combined = None
+
+        return
+
+
+    def scope(self, expression):
+        """
+        Returns the pattern of a compiled expression wrapped in a group
+        carrying its flags, so that it can be safely combined with others.
+        """
+
+        flags = "".join(
+            letter for flag, letter in SCOPED_FLAGS.items()
+            if expression.flags & flag
+        )
+
+        if flags:
+            return f"(?{flags}:{expression.pattern})"
+        else:
+            return f"(?:{expression.pattern})"
+
+
+    def candidates(self, lines):
+        """
+        Yields (line_number, line) for each line that contains the shared
+        literal prefix, and so could be matched by one of the expressions.
+        """
+
+        if not self.prefix:
+            yield from enumerate(lines)
+
+            return
+
+        prefix = self.prefix
+
+        for number, line in enumerate(lines):
+            if prefix in line:
+                yield number, line
+
+        return
+
+
+    def search(self, line):
+        """
+        Looks for a match in the generators object.
+
+        If there is a match to the line, (generator, match) is returned, where
+        match is the re.Match object for that generator's own expression (so
+        that the capturing groups are numbered as the generator expects).
+
+        If not, then this function returns None.
+        """
+
+        if self.combined is None:
+            for expression, generator in self.generators.items():
+                matches = expression.search(line)
+
+                if matches:
+                    return generator, matches
+            else:
+                return None
+
+        matches = self.combined.search(line)
+
+        if matches:
+            expression, generator = self.groups[matches.lastgroup]
+
+            # Anchored at the known start, so this is not a second search.
+            return generator, expression.match(line, matches.start())
+        else:
+            return None
+
+
+    def match(self, line):
+        """
+        Looks for a match in the generators object.
+
+        If there is a match to the line, the matching generator is returned.
+
+        If not, then this function returns false.
+        """
+
+        found = self.search(line)
+
+        if found:
+            return found[0]
+        else:
+            return False
@@ -3,12 +3,31 @@ Main objects file. This contains two objects:
 
     + Parser (the main Parser object),
     + Generator (which all generators inherit from.
+
+as well as convert(), which runs a string through ltmd (and so pandoc), and
+make_uid(), which makes the placeholders that we send through pandoc.
 """
 
 
 import re
+import hashlib
+import inspect
 import ltmd
 
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .matcher import Matcher
+
+
+# The form of the temporary replacements that we put through pandoc (see
+# make_uid).
+PLACEHOLDER = re.compile(r"projection[0-9a-f]{16}")
+
+# The lines that open and close the body of a full LaTeX document.
+BEGIN_DOCUMENT = re.compile(r"^\s*\\begin\{document\}")
+END_DOCUMENT = re.compile(r"^\s*\\end\{document\}")
+
 
 class Parser(object):
     """
@@ -21,8 +40,41 @@ class Parser(object):
       processing loop
     + Run pandoc (via ltmd).
     + Replace the placeholder strings with output.
+
+    By default the whole document goes through a single pandoc process. If
+    processes is given, the document is instead split into chunks at each
+    section in the document body, and the chunks are converted concurrently
+    by that many pandoc processes. Every chunk carries the preamble (see
+    Parser.chunks), but only use this if your sections are 'safe'
+    boundaries, i.e. no LaTeX environment (or group) in the body is left
+    open across a section.
+
+    If a cache.PandocCache is given as cache, it is consulted before
+    running pandoc on the document (or on each chunk).
+
+    text can be a list of lines, or any other iterable of lines (such as a
+    source.TexSource), which is read in a single pass. A source that
+    behaves like a list and can find its own candidate lines, such as a
+    source.MappedTexSource, is used in place. If it has an origin
+    function (as TexSource does), Parser.origins maps the uid of each match
+    to the (filename, line_number) that it came from.
+
+    generators is a dictionary of {compiled_expression: generator}, where
+    generator(input) makes the Generator object for a matching line. If it
+    also takes match and uid keyword arguments, it is given the match
+    object and the uid (see make_uid) too; otherwise, these are set on the
+    object afterwards.
+
+    If run is False, nothing is done until Parser.run_matching (which finds
+    the matches) and Parser.run_conversion (which sends the text through
+    pandoc) are called.
+
+    document identifies the document (Config uses the path of the .tex
+    file), and goes into the uid of every match, so that documents that
+    share a database cannot have the same uids (see make_uid).
     """
-    def __init__(self, text, generators):
+    def __init__(self, text, generators, processes=None, cache=None,
+            run=True, document=None):
         """
         Initial processing loop.
         """
@@ -30,12 +82,39 @@ class Parser(object):
         self.text = text
         self.original_matches = {}
         self.matches = {}
+        self.origins = {}
         self.generators = generators
+        self.matcher = Matcher(generators)
+        self.extended = {}
+        self.processes = processes
+        self.cache = cache
+        self.document = document
+
+        if run:
+            self.run_matching()
+            self.run_conversion()
+
+        return
+
+
+    def run_matching(self):
+        """
+        Finds the matches in the text, without changing it.
+        """
 
         # initial match extraction
         self.find_matches()
         self.original_matches = self.matches.copy()
 
+        return
+
+
+    def run_conversion(self):
+        """
+        Sends the text, with the matches swapped out, through pandoc, and
+        puts the output text of each match in its place.
+        """
+
         # replace matches with temp strings
         self.replace_with_temp()
 
@@ -52,11 +131,81 @@ class Parser(object):
 
 
     def find_matches(self):
-        for number, line in enumerate(self.text):
-            match = self.match(line)
-            
-            if match:
-                self.matches[number] = match(line)
+        """
+        Finds the matches in the text. Only lines that pass the matcher's
+        literal prefilter are searched with the full expressions.
+
+        Each match is given a uid made from its line and the number of times
+        that we have already seen that line, so that the uids are the same
+        from one run to the next.
+        """
+
+        source = self.text
+        origin = getattr(source, "origin", None)
+
+        if hasattr(source, "candidates"):
+            # The source can find its own candidate lines without reading
+            # the others (see source.MappedTexSource), and we can leave it
+            # as our text, as it behaves like a list.
+            candidates = source.candidates(self.matcher.prefix)
+        elif not isinstance(source, list):
+            # Keep the lines as they stream past, for pandoc later.
+            self.text = []
+            self.original_text = self.text
+
+            candidates = self.matcher.candidates(self.keep(source, self.text))
+        else:
+            candidates = self.matcher.candidates(source)
+
+        occurrences = Counter()
+
+        for number, line in candidates:
+            found = self.matcher.search(line)
+
+            if found:
+                generator, match = found
+                uid = make_uid(line, occurrences[line], self.document)
+                occurrences[line] += 1
+
+                self.matches[number] = self.make(generator, line, match, uid)
+
+                if origin is not None:
+                    self.origins[uid] = origin(number)
+
+        return
+
+
+    def make(self, generator, line, match, uid):
+        """
+        Calls generator on line, passing on the match object and uid if it
+        takes them. Generators that only take the line still get our uid,
+        as it is set (and the object re-parsed) afterwards.
+        """
+
+        try:
+            extended = self.extended[generator]
+        except KeyError:
+            extended = self.extended[generator] = takes_extras(generator)
+
+        if extended:
+            return generator(line, match=match, uid=uid)
+
+        result = generator(line)
+        result.uid = uid
+        result.parse()
+
+        return result
+
+
+    def keep(self, source, lines):
+        """
+        Yields the lines of source, appending each one to lines.
+        """
+
+        for line in source:
+            lines.append(line)
+
+            yield line
 
         return
 
@@ -68,16 +217,11 @@ class Parser(object):
         If there is a match to the line, the matching generator is returned.
 
         If not, then this function returns false.
-        """
 
-        for expression, generator in self.generators.items():
-            matches = expression.search(line)
-
-            if matches:
-                return generator
+        All of the generators are tried at once -- see matcher.Matcher.
+        """
 
-        else:
-            return False
+        return self.matcher.match(line)
 
 
     def replace_with_temp(self):
@@ -91,11 +235,76 @@ class Parser(object):
         return
 
 
-    def pandoc_it(self, image_prepend=None, extra=None):
+    def chunks(self):
+        """
+        Split the text into chunks, starting a new chunk at each section
+        placeholder in the document body. Returns a list of strings, in
+        document order.
+
+        If the text is a full document, everything up to and including
+        \\begin{document} (the preamble, with any macro definitions) is put
+        at the start of every chunk, and every chunk is closed with
+        \\end{document}. Anything after \\end{document} is dropped, as
+        pandoc would drop it anyway.
+        """
+
+        # Imported here to avoid a circular import with generators.py
+        from .generators import Section
+
+        begin, end = self.document_body()
+
+        boundaries = [
+            line_number for line_number, match in self.matches.items()
+            if isinstance(match, Section) and begin < line_number < end
+        ]
+
+        boundaries = sorted(set([begin] + boundaries + [end]))
+
+        if begin:
+            preamble = "\n".join(self.text[:begin]) + "\n"
+            closing = "\n\\end{document}"
+        else:
+            preamble = ""
+            closing = ""
+
+        chunks = [
+            preamble + "\n".join(self.text[start:end]) + closing
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+        return chunks
+
+
+    def document_body(self):
+        """
+        Returns the (first, last) line numbers of the document body, i.e.
+        the lines after \\begin{document} and before \\end{document}. If
+        there is no \\begin{document}, this is the whole text.
+        """
+
+        begin = 0
+        end = len(self.text)
+
+        for line_number, line in enumerate(self.text):
+            if not begin:
+                if BEGIN_DOCUMENT.match(line):
+                    begin = line_number + 1
+            elif END_DOCUMENT.match(line):
+                end = line_number
+                break
+
+        return begin, end
+
+
+    def pandoc_it(self, image_prepend=None, extra=None, processes=None):
         """
         Put the text trough ltmd (pandoc!) and convert it to markdown.
         We'll then split it back into a list of lines (as that's a more
         convenient way of storing it).
+
+        If processes (or Parser.processes) is set, the text is converted in
+        chunks (see Parser.chunks) by a pool of that many pandoc processes,
+        and the results are stitched back together in order.
         """
         if image_prepend is None:
             image_prepend = "/"
@@ -105,15 +314,20 @@ class Parser(object):
         elif "--wrap=preserve" not in extra:
             extra += ["--wrap=preserve"]
 
-        joined_text = "\n".join(self.text)
+        if processes is None:
+            processes = self.processes
 
-        # See the ltmd API reference
-        pre_processed = ltmd.PreProcess(joined_text, img_prepend=image_prepend)
-        pandocced = ltmd.run_pandoc(pre_processed.parsed_text, extra=extra)
-        post_processed = ltmd.PostProcess(pandocced, pre_processed.parsed_data)
-        
-        output_text = post_processed.parsed_text
-        # End of ltmd use
+        def convert_chunk(chunk):
+            return convert(chunk, image_prepend, extra, cache=self.cache)
+
+        if processes is None:
+            output_text = convert_chunk("\n".join(self.text))
+        else:
+            with ThreadPoolExecutor(max_workers=processes) as executor:
+                # pandoc runs in a subprocess, so threads are enough here.
+                outputs = executor.map(convert_chunk, self.chunks())
+
+                output_text = "\n".join(outputs)
 
         unjoined_text = output_text.split("\n")
 
@@ -127,37 +341,43 @@ class Parser(object):
         The line numbers may have changed now that we have put our stuff
         through pandoc. Let's fix that!
 
-        What we _do_ know though is that our matches will still be in the
-        same order! Therefore we only need to test against a single item.
+        We index our matches by their temporary replacement and make a single
+        pass over the text. Usually a placeholder is a line on its own, so we
+        can look the whole line up in the index; if not, pandoc may have
+        embedded it inside a longer line, so we look for anything that has
+        the form of a placeholder in the line.
         """
         if len(self.matches) == 0:
             return
 
         new_matches = {}
 
-        match_items = self.matches.items()
-        search_items = [x[1] for x in match_items]
-       
-        # Set initial check
-        check_for = search_items.pop(0)
+        search_items = {
+            x.temporary_replacement: x for x in self.matches.values()
+        }
 
         for line_number, line in enumerate(self.text):
-            if line == check_for.temporary_replacement:
-                new_matches[line_number] = check_for
-               
-                try:
-                    check_for = search_items.pop(0)
-                except IndexError:
-                    # We've found _all_ of our matches!
-                    self.matches = new_matches
-
-                    return
+            if line in search_items:
+                new_matches[line_number] = search_items.pop(line)
+            else:
+                for placeholder in PLACEHOLDER.findall(line):
+                    # Only one match can live on each line.
+                    if placeholder in search_items \
+                            and line_number not in new_matches:
+                        new_matches[line_number] = \
+                            search_items.pop(placeholder)
+
+            if not search_items:
+                # We've found _all_ of our matches!
+                self.matches = new_matches
+
+                return
 
         # We didn't find some matches - clean up and then raise an
         # Exception in case someone wants to catch it.
         self.matches = new_matches
 
-        not_found = [x.temporary_replacement for x in search_items]
+        not_found = list(search_items.keys())
         raise Exception(f"{not_found}\
                           The above items were not found in the\
                           post-pandoc text.")
@@ -170,38 +390,129 @@ class Parser(object):
         Replace the temporary things that were used to track our items through
         pandoc with our final text.
         
-        This should preserve line numbers.
+        This should preserve line numbers. If pandoc has embedded the
+        placeholder in a longer line, only the placeholder is replaced.
         """
         
         for line_number, match in self.matches.items():
-            self.text[line_number] = match.output_text
+            self.text[line_number] = self.text[line_number].replace(
+                match.temporary_replacement, match.output_text
+            )
 
         return
 
 
+def convert(text, image_prepend, extra, cache=None):
+    """
+    Put a string through ltmd (pandoc!) and return the markdown.
+
+    If a cache.PandocCache is given, we look there first, and store the
+    output there afterwards.
+    """
+
+    if cache is not None:
+        key = cache.key(text, image_prepend, extra)
+        output = cache.get(key)
+
+        if output is not None:
+            return output
+
+    # See the ltmd API reference
+    pre_processed = ltmd.PreProcess(text, img_prepend=image_prepend)
+    pandocced = ltmd.run_pandoc(pre_processed.parsed_text, extra=extra)
+    post_processed = ltmd.PostProcess(pandocced, pre_processed.parsed_data)
+    # End of ltmd use
+
+    output = post_processed.parsed_text
+
+    if cache is not None:
+        cache.put(key, output)
+
+    return output
+
+
+def takes_extras(generator):
+    """
+    Whether generator takes the match and uid keyword arguments (or any
+    keyword arguments) as well as the input line.
+    """
+
+    try:
+        parameters = inspect.signature(generator).parameters.values()
+    except (TypeError, ValueError):
+        return False
+
+    names = set()
+
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_KEYWORD:
+            return True
+
+        if parameter.kind != parameter.POSITIONAL_ONLY:
+            names.add(parameter.name)
+
+    return {"match", "uid"} <= names
+
+
+def make_uid(input, occurrence=0, document=None):
+    """
+    Makes the uid (which is also the placeholder that goes through pandoc)
+    for a line of input. This is the occurrence'th time that we have seen
+    this exact line in the document.
+
+    The uid only depends on these two things (and document, which
+    identifies the document, if it is given), so it is the same from one run
+    to the next, even if the rest of the document has changed.
+    """
+
+    if document is None:
+        key = f"{occurrence}:{input}"
+    else:
+        key = f"{document}:{occurrence}:{input}"
+
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    return f"projection{digest[:16]}"
+
+
 class Generator(object):
     """
     Generic generator object for inheriting to other objects.
 
     The following functions will need to be implemented by daugter objects:
 
-    + parse() which parses self.input to:
-      - uid (string)
+    + parse(match) which parses self.input to:
+      - uid (string, if one was not given to the constructor)
       - temorary_replacement (string)
       - output_text (string)
 
+      where match is the re.Match object found by the Parser (or None, in
+      which case the daughter object should search self.input itself).
+
     + unpack(**dict) which unpacks a dictionary to the object's properties.
+      The arguments must be in the same order as the columns in the
+      database, as they are also used by from_row.
 
     + pack() which is the opposite of unpack.
+
+    + pack_tuple() which returns the same values as pack, as a tuple.
+
+    Daughter objects should list their attributes in __slots__, as large
+    documents can create a lot of these objects.
     """
-    def __init__(self, input=None):
+    __slots__ = ()
+
+    def __init__(self, input=None, match=None):
         """
         Generators should be built such that they can unpack from dictionaries
         passed to input if necessary.
+
+        If the Parser has already matched the input, the match object can be
+        passed so that it does not have to be searched for again.
         """
         if isinstance(input, str):
             self.input = input
-            self.parse()
+            self.parse(match)
 
         elif isinstance(input, dict):
             # Unpack.
@@ -219,11 +530,25 @@ class Generator(object):
             )
 
 
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build the object from a tuple (for example, a row from the database)
+        in the same order as the arguments to unpack, without building an
+        intermediate dictionary.
+        """
+        generator = cls.__new__(cls)
+        generator.unpack(*row)
+
+        return generator
+
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return type(self) is type(other) \
+            and self.pack_tuple() == other.pack_tuple()
 
 
-    def parse(self):
+    def parse(self, match=None):
         """
         Parse the object. This needs to be called from a daughter object.
         """
@@ -244,3 +569,11 @@ class Generator(object):
         pass
 
 
+    def pack_tuple(self):
+        """
+        Return the values of pack() as a tuple, without building the
+        dictionary.
+        """
+        pass
+
+
@@ -3,10 +3,12 @@ Contains a number of postprocessing functions that essentially assign
 the line numbers and relevant text to the 'Generator' objects.
 """
 
-from .objects import Parser
+from .objects import Parser, Generator
 from .generators import Section, Collector, Removal
 
-from typing import List
+from typing import Any, Dict, Iterable, List, Tuple
+
+import heapq
 
 def assign_section_line_numbers(parser: Parser, id=None) -> List[Section]: 
     """
@@ -132,3 +134,136 @@ def assign_removal_text(parser: Parser, id=None) -> List[Removal]:
     return removals
 
 
+
+
+def assign_all(parser: Parser) -> Dict[Tuple[type, Any], List[Generator]]:
+    """
+    Does the work of all of the functions above, for every id at once, in a
+    single pass over the matches:
+
+        + Sections get their line numbers, and their text becomes a view
+          onto parser.text (see Section.view) rather than a copy,
+        + Collectors get their line numbers,
+        + Removals get their line numbers and text, and the removal-end
+          objects are deleted from the parser (see pair_removals).
+
+    Returns a dictionary of {(type, id): list of matches} and _also_
+    modifies the parser object.
+    """
+
+    buckets = {}
+    previous_sections = {}
+    removals = []
+
+    for line, match in parser.matches.items():
+        match.line = line
+
+        if isinstance(match, Section):
+            match.startline = line
+
+            previous = previous_sections.get(match.id)
+
+            if previous is not None:
+                previous.endline = line
+                previous.view(parser.text)
+
+            previous_sections[match.id] = match
+
+        elif isinstance(match, Removal):
+            # Bucketed below, once we know which ones are the ends.
+            removals.append((line, match))
+            continue
+
+        buckets.setdefault((type(match), match.id), []).append(match)
+
+
+    # Do the last ones!
+    for section in previous_sections.values():
+        section.endline = len(parser.text)
+        section.view(parser.text)
+
+    for removal in pair_removals(parser, removals):
+        buckets.setdefault((Removal, removal.id), []).append(removal)
+
+
+    return buckets
+
+
+def pair_removals(
+        parser: Parser,
+        removals: List[Tuple[int, Removal]]
+    ) -> List[Removal]:
+    """
+    Pairs up the removal start and end objects (given as (line, removal), in
+    line order), for every id at once. Each start gets its line numbers and
+    text, and the end objects are deleted from the parser. A start without
+    an end is left as it is.
+
+    Returns the list of removal-start objects.
+    """
+
+    starts = []
+    open_starts = {}
+
+    for line, match in removals:
+        match.line = line
+
+        if match.se == "s":
+            open_starts[match.id] = match
+            starts.append(match)
+
+        elif match.se == "e":
+            start = open_starts.pop(match.id, None)
+
+            if start is None:
+                raise AttributeError("Removal ended before it started.")
+
+            start.startline = start.line
+            start.endline = line
+            start.text = "\n".join(parser.text[start.startline:line+1])
+
+            del parser.matches[line]
+
+        else:
+            raise AttributeError("Start/end of Removal object not set.")
+
+    return starts
+
+
+def assign_section_collectors(
+        sections: Iterable[Section],
+        collectors: Iterable[Collector]
+    ) -> List[Tuple[str, str]]:
+    """
+    Works out which sections each collector is inside, once their line
+    numbers have been assigned. Sections of different ids can overlap (for
+    example, Notes and Lectures), so a collector can be in several.
+
+    This is a single sweep down the document: sections are added to a heap
+    (ordered by endline) as we reach their startline, and dropped once we
+    have passed their endline.
+
+    Returns a list of (section uid, collector uid) pairs.
+    """
+
+    sections = sorted(sections, key=lambda x: x.startline)
+    collectors = sorted(collectors, key=lambda x: x.line)
+
+    pairs = []
+    active = []
+    next_section = 0
+
+    for collector in collectors:
+        while next_section < len(sections) and \
+                sections[next_section].startline <= collector.line:
+            section = sections[next_section]
+            heapq.heappush(active, (section.endline, next_section, section))
+            next_section += 1
+
+        # A section ends on the line before its endline.
+        while active and active[0][0] <= collector.line:
+            heapq.heappop(active)
+
+        pairs += [(section.uid, collector.uid) for _, _, section in active]
+
+    return pairs
@@ -0,0 +1,390 @@
+"""
+Contains the two document sources that can be given to the Parser:
+
+    + TexSource, which streams the lines of a .tex document, expanding any
+      \\input{} and \\include{} commands as it goes, and keeps track of
+      which file (and line in that file) each line came from.
+    + MappedTexSource, which memory-maps a single (very large) .tex file,
+      and only decodes the lines that are asked for.
+"""
+
+import bisect
+import locale
+import mmap
+import os
+import re
+
+
+# A line that only contains an \input{} or \include{} (and maybe a comment).
+INPUT = re.compile(r"^\s*\\(?:input|include)\{([^}]*)\}\s*(?:%.*)?$")
+
+
+class TexSource(object):
+    """
+    Iterable over the lines of a .tex file (with their line endings, as
+    from file.readlines()), with \\input{} and \\include{} lines replaced by
+    the lines of the file that they point to. Files are only opened when
+    the iteration reaches them.
+
+    As in LaTeX, included filenames are relative to the directory of the
+    main document, and have .tex added if they have no extension. Only
+    commands that are on a line of their own are expanded -- anything else
+    is left for pandoc.
+
+    Once a line has been read, TexSource.origin(line_number) gives the
+    (filename, line_number) that it came from.
+
+    encoding is that of the files, and defaults to the locale's preferred
+    encoding (as for open()).
+    """
+    def __init__(self, filename, encoding=None):
+        self.filename = filename
+        self.encoding = encoding
+        self.directory = os.path.dirname(filename)
+
+        # Runs of lines from the same file, as (first line number in the
+        # document, filename, first line number in that file).
+        self.starts = []
+        self.runs = []
+        self.number = 0
+
+        return
+
+
+    def __iter__(self):
+        self.starts = []
+        self.runs = []
+        self.number = 0
+
+        yield from self.read(self.filename, ())
+
+        return
+
+
+    def read(self, filename, parents):
+        """
+        Yields the lines of filename, expanding any inputs. parents are the
+        files that included this one, so that we can spot loops.
+        """
+
+        if filename in parents:
+            raise ValueError(f"{filename} includes itself (via {parents}).")
+
+        # Noted before opening, so that filenames() includes files that are
+        # missing (and so can be watched for).
+        self.start_run(filename, 0)
+
+        with open(filename, "r", encoding=self.encoding) as file:
+            for local_number, line in enumerate(file):
+                found = INPUT.match(line)
+
+                if found:
+                    yield from self.read(
+                        self.resolve(found[1]), parents + (filename,)
+                    )
+
+                    self.start_run(filename, local_number + 1)
+                else:
+                    self.number += 1
+
+                    yield line
+
+        return
+
+
+    def resolve(self, name):
+        """
+        Returns the filename for the argument of an \\input{}.
+        """
+
+        if not os.path.splitext(name)[1]:
+            name = f"{name}.tex"
+
+        return os.path.join(self.directory, name)
+
+
+    def start_run(self, filename, local_number):
+        """
+        Note that the following lines come from filename, starting at
+        local_number.
+        """
+
+        self.starts.append(self.number)
+        self.runs.append((filename, local_number))
+
+        return
+
+
+    def origin(self, number):
+        """
+        Returns the (filename, line_number) that line number of the document
+        came from. Line numbers start at zero, as in the Parser.
+        """
+
+        run = bisect.bisect_right(self.starts, number) - 1
+        filename, local_number = self.runs[run]
+
+        return filename, local_number + number - self.starts[run]
+
+
+    def filenames(self):
+        """
+        Returns the set of files that have been read so far.
+        """
+
+        return {filename for filename, _ in self.runs}
+
+
+class MappedTexSource(object):
+    """
+    A single .tex file that is memory-mapped rather than read in. It behaves
+    like the list of lines from file.readlines() (it supports len, indexing,
+    slicing, iteration and assigning to a line), but lines are only decoded
+    when they are asked for, and assigned lines are kept separately.
+
+    The Parser uses MappedTexSource.candidates to find the lines that could
+    contain custom syntax by searching the raw bytes, so that the rest of
+    the document is only decoded when it is sent to pandoc (chunk by chunk,
+    if the Parser is given processes).
+
+    As in TexSource, encoding defaults to the locale's preferred encoding,
+    and \\r\\n line endings come out as \\n (as they do from a file opened
+    in text mode). Unlike text mode, a lone \\r does not end a line, so files
+    that use old Mac line endings are not supported.
+
+    The mapping is held open until MappedTexSource.close is called (or the
+    with block that it was opened in ends).
+
+    \\input{} and \\include{} are not expanded -- use TexSource for that.
+    """
+
+    # Number of bytes that we look at in one go when counting lines.
+    window = 1 << 20
+
+    def __init__(self, filename, encoding=None):
+        self.filename = filename
+        self.encoding = encoding or locale.getpreferredencoding(False)
+
+        with open(filename, "rb") as file:
+            if os.fstat(file.fileno()).st_size:
+                self.map = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                # Empty files can't be mapped.
+                self.map = b""
+
+        self.length = self.count_lines(0, len(self.map))
+
+        if self.map[-1:] not in (b"", b"\n"):
+            # The last line has no newline.
+            self.length += 1
+
+        # Line numbers whose starting byte we know, and those bytes.
+        self.known = [0]
+        self.offsets = [0]
+
+        self.replaced = {}
+
+        return
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+        return
+
+
+    def close(self):
+        """
+        Closes the memory map. Lines that have been read (or assigned) are
+        not affected, but no more can be read.
+        """
+
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+        return
+
+
+    def count_lines(self, start, end):
+        """
+        Counts the newlines between bytes start and end, a window at a time.
+        """
+
+        count = 0
+
+        for position in range(start, end, self.window):
+            count += self.map[position:min(position + self.window, end)]\
+                .count(b"\n")
+
+        return count
+
+
+    def remember(self, number, offset):
+        """
+        Note that line number starts at byte offset.
+        """
+
+        index = bisect.bisect_left(self.known, number)
+
+        if index == len(self.known) or self.known[index] != number:
+            self.known.insert(index, number)
+            self.offsets.insert(index, offset)
+
+        return
+
+
+    def offset(self, number):
+        """
+        Returns the byte that line number starts at, walking forward from
+        the closest line that we know about.
+        """
+
+        if number >= self.length:
+            return len(self.map)
+
+        index = bisect.bisect_right(self.known, number) - 1
+        offset = self.offsets[index]
+
+        for _ in range(number - self.known[index]):
+            offset = self.map.find(b"\n", offset) + 1
+
+        return offset
+
+
+    def decode(self, start, end):
+        """
+        Returns the list of lines (with their newlines, which are always
+        \\n) between bytes start and end.
+        """
+
+        parts = self.map[start:end].split(b"\n")
+        last = parts.pop()
+
+        lines = [
+            (part[:-1] if part.endswith(b"\r") else part)
+            .decode(self.encoding) + "\n"
+            for part in parts
+        ]
+
+        if last:
+            lines.append(last.decode(self.encoding))
+
+        return lines
+
+
+    def candidates(self, prefix):
+        """
+        Yields (line_number, line) for each line that contains prefix,
+        searching the mapped bytes directly. Only these lines are decoded.
+        """
+
+        needle = prefix.encode(self.encoding)
+
+        if not needle:
+            yield from enumerate(self)
+
+            return
+
+        number = 0
+        counted = 0
+        position = self.map.find(needle)
+
+        while position != -1:
+            start = self.map.rfind(b"\n", 0, position) + 1
+            end = self.map.find(b"\n", position)
+            end = len(self.map) if end == -1 else end + 1
+
+            number += self.count_lines(counted, start)
+            counted = start
+
+            self.remember(number, start)
+
+            yield number, self[number]
+
+            position = self.map.find(needle, end)
+
+        return
+
+
+    def origin(self, number):
+        """
+        Returns the (filename, line_number) that line number came from.
+        """
+
+        return self.filename, number
+
+
+    def filenames(self):
+        """
+        Returns the set of files that are read (just the one).
+        """
+
+        return {self.filename}
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+
+            if step != 1:
+                return [self[number] for number in range(start, stop, step)]
+
+            lines = self.decode(self.offset(start), self.offset(stop)) \
+                if start < stop else []
+
+            for number, line in self.replaced.items():
+                if start <= number < stop:
+                    lines[number - start] = line
+
+            return lines
+
+        if key < 0:
+            key += self.length
+
+        if not 0 <= key < self.length:
+            raise IndexError("MappedTexSource index out of range")
+
+        if key in self.replaced:
+            return self.replaced[key]
+
+        start = self.offset(key)
+        end = self.map.find(b"\n", start)
+        end = len(self.map) if end == -1 else end + 1
+
+        return self.decode(start, end)[0]
+
+
+    def __setitem__(self, key, value):
+        if key < 0:
+            key += self.length
+
+        self.replaced[key] = value
+
+        return
+
+
+    def __iter__(self):
+        start = 0
+
+        for number in range(self.length):
+            end = self.map.find(b"\n", start)
+            end = len(self.map) if end == -1 else end + 1
+
+            if number in self.replaced:
+                yield self.replaced[number]
+            else:
+                yield self.decode(start, end)[0]
+
+            start = end
+
+        return
@@ -0,0 +1,238 @@
+"""
+Watches a document (the .tex file, any files that it \\input{}s, and the
+configuration file) and rebuilds it incrementally whenever it changes.
+
+Files are polled for changes to their modification time and size. Once a
+change is seen, we wait until the files have been quiet for a moment (as
+editors often write several times when saving) and then rebuild.
+
+Between rebuilds, the pandoc cache and the database connection are kept
+open, so pandoc is only run if the document has changed (or, if processes
+is given, only on the sections that have changed -- see Config), and only
+the rows that have changed are written.
+
+This can be run as
+
+    python -m projection.watch notes.tex config.yml --processes 4
+"""
+
+from .io import Database
+from .parser.config import Config
+
+import argparse
+import os
+import time
+import traceback
+
+
+class Watcher(object):
+    """
+    Rebuilds a document whenever one of its files changes.
+
+    interval is how often (in seconds) the files are checked, and debounce
+    is how long they must be left alone before we rebuild. mapped and
+    processes are passed on to parser.config.Config.
+    """
+    def __init__(self, tex_filename, config_filename, interval=0.5,
+            debounce=0.2, mapped=False, processes=None):
+        self.tex_filename = tex_filename
+        self.config_filename = config_filename
+        self.interval = interval
+        self.debounce = debounce
+        self.mapped = mapped
+        self.processes = processes
+
+        self.files = {tex_filename, config_filename}
+        self.cache = None
+        self.db = None
+        self.database_filename = None
+        self.config = None
+
+        return
+
+
+    def __del__(self):
+        self.close()
+
+        return
+
+
+    def snapshot(self, filenames=None):
+        """
+        Returns {filename: (modification time, size)} for filenames (by
+        default, the watched files). Files that are missing have None.
+        """
+
+        snapshot = {}
+
+        for filename in self.files if filenames is None else filenames:
+            try:
+                stat = os.stat(filename)
+                snapshot[filename] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                snapshot[filename] = None
+
+        return snapshot
+
+
+    def rebuild(self):
+        """
+        Runs an incremental build, re-using our pandoc cache and database
+        connection if the configuration still points at the same ones.
+        """
+
+        config = Config(
+            self.tex_filename,
+            self.config_filename,
+            incremental=True,
+            mapped=self.mapped,
+            processes=self.processes,
+            run=False
+        ).load()
+
+        meta = config.raw_data["meta"]
+        database_filename = meta["database"]
+
+        if database_filename != self.database_filename:
+            self.close()
+
+            self.db = Database(
+                database_filename, search=meta.get("search", False)
+            )
+            self.database_filename = database_filename
+
+        directory = config.cache_directory()
+
+        if self.cache is None or self.cache.directory != directory:
+            self.cache = config.get_cache(directory)
+
+        config.cache = self.cache
+        config.database = self.db
+
+        self.config = config
+
+        try:
+            config.persist()
+        finally:
+            # Watch any files that were read, even if the build failed.
+            if hasattr(config, "text_data"):
+                self.files |= config.text_data.filenames()
+
+                if self.mapped:
+                    # Don't keep a mapping open for every rebuild.
+                    config.text_data.close()
+
+        return config
+
+
+    def wait(self, before):
+        """
+        Waits until the files change from the snapshot before, and then
+        until they stop changing. Returns the new snapshot.
+        """
+
+        while True:
+            time.sleep(self.interval)
+
+            after = self.snapshot()
+
+            if after != before:
+                break
+
+        while True:
+            time.sleep(self.debounce)
+
+            settled = self.snapshot()
+
+            if settled == after:
+                return settled
+
+            after = settled
+
+
+    def run(self, rebuilds=None):
+        """
+        Builds the document, and then rebuilds it after each change. This
+        runs forever, unless rebuilds (the number of rebuilds after the
+        first build) is given.
+
+        Errors in a build are printed, and we carry on watching.
+        """
+
+        count = 0
+        before = self.snapshot()
+
+        while True:
+            try:
+                self.rebuild()
+                print(f"Built {self.tex_filename}")
+            except Exception:
+                traceback.print_exc()
+
+            # Changes made during the build still count, but files that we
+            # have only just started watching do not.
+            before.update(self.snapshot(self.files - before.keys()))
+
+            if rebuilds is not None and count >= rebuilds:
+                break
+
+            before = self.wait(before)
+
+            count += 1
+
+        return
+
+
+    def close(self):
+        """
+        Closes the database connection, if there is one.
+        """
+
+        if self.db is not None:
+            self.db.close_connection()
+            self.db = None
+            self.database_filename = None
+
+        return
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(
+        description="Rebuild a document whenever it changes."
+    )
+
+    argument_parser.add_argument("tex", help="The .tex file.")
+    argument_parser.add_argument("config", help="The configuration file.")
+    argument_parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="How often (in seconds) to check for changes."
+    )
+    argument_parser.add_argument(
+        "--mapped",
+        action="store_true",
+        help="Memory-map the .tex file (inputs are not expanded)."
+    )
+    argument_parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Convert the document in chunks (one per section) with this "
+             "many pandoc processes, so only changed sections are re-run."
+    )
+
+    arguments = argument_parser.parse_args()
+
+    watcher = Watcher(
+        arguments.tex,
+        arguments.config,
+        interval=arguments.interval,
+        mapped=arguments.mapped,
+        processes=arguments.processes
+    )
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.close()
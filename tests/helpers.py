@@ -0,0 +1,95 @@
+"""
+Helpers shared between the tests: the generators used by the
+postprocessing tests (test_postprocessing and test_arrays), and a document
+and its configuration file on disk (for test_build, test_config, test_watch
+and test_site).
+"""
+
+from projection.parser.generators import Section, Collector, Removal
+
+import os
+import re
+import yaml
+
+
+def postprocess_generators():
+    """
+    Returns a generators dictionary with two overlapping types of section
+    (\\findme, id 0, and \\findyou, id 1), a collector (\\findcollector,
+    id 2) and a removal (\\beginpdfonly to \\endpdfonly, id 3).
+    """
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, id=0, **kwargs)
+
+    def secgenii(input, **kwargs):
+        return Section(input, r"%%\\findyou{(.*?)}", capture=1, id=1, **kwargs)
+
+    def colgen(input, **kwargs):
+        return Collector(input, r"%%\\findcollector{.*?}", id=2, **kwargs)
+
+    def remgens(input, **kwargs):
+        return Removal(input, r"%%\\beginpdfonly", se="s", id=3, **kwargs)
+
+    def remgene(input, **kwargs):
+        return Removal(input, r"%%\\endpdfonly", se="e", id=3, **kwargs)
+
+    return {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+        re.compile(r"%%\\findyou{(.*?)}"): secgenii,
+        re.compile(r"%%\\findcollector{.*?}"): colgen,
+        re.compile(r"%%\\beginpdfonly"): remgens,
+        re.compile(r"%%\\endpdfonly"): remgene,
+    }
+
+
+def configuration(database, sections=None, collectors=None, pages=None,
+        **meta):
+    """
+    Returns the contents of a configuration file, as a dictionary. By
+    default, there is one type of section ("Notes", from \\section{}) and one
+    of collector ("Keypoints", from \\keypoint{}). Any other keyword
+    arguments are added to meta.
+    """
+
+    if sections is None:
+        sections = [{"name": "Notes", "syntax": "section", "level": 1}]
+
+    if collectors is None:
+        collectors = [{"name": "Keypoints", "syntax": "keypoint"}]
+
+    config = {
+        "meta": {"database": database, **meta},
+        "sections": sections,
+        "collectors": collectors,
+        "removals": [],
+    }
+
+    if pages is not None:
+        config["pages"] = pages
+
+    return config
+
+
+def write_document(directory, text, database=None, **kwargs):
+    """
+    Writes text to notes.tex in directory, and a configuration file (see
+    configuration, which is given kwargs) to config.yml. The database
+    defaults to notes.db in directory.
+
+    Returns the filenames of the document and the configuration file.
+    """
+
+    tex = os.path.join(directory, "notes.tex")
+    config = os.path.join(directory, "config.yml")
+
+    if database is None:
+        database = os.path.join(directory, "notes.db")
+
+    with open(tex, "w") as file:
+        file.write(text)
+
+    with open(config, "w") as file:
+        yaml.safe_dump(configuration(database, **kwargs), file)
+
+    return tex, config
@@ -0,0 +1,172 @@
+"""
+Tests for the array-backed postprocessing.
+
+This can be found in arrays.py. These need NumPy, and are skipped if it is
+not installed.
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from projection.parser import arrays
+from projection.parser.postprocess import \
+        assign_all,\
+        assign_section_collectors
+from projection.parser.objects import Parser
+from projection.parser.generators import Section, Collector, Removal
+
+from helpers import postprocess_generators
+
+
+INPUT_TEXT = [
+    r"hello world",
+    r"%%\findme{Section}",
+    r"%%\findcollector{Collector 1}",
+    r"%%\findyou{Section 2}",
+    r"%%\findcollector{Collector 2}",
+    r"%%\beginpdfonly",
+    r"THIS IS ONLY FOR THE PDF!",
+    r"%%\endpdfonly",
+    r"goodbye world",
+    r"%%\findme{Section 3}",
+    r"%%\findcollector{Collector 3}",
+    "",
+]
+
+
+def make_parser():
+    """
+    Parses INPUT_TEXT, with two overlapping types of section.
+    """
+
+    return Parser(INPUT_TEXT.copy(), postprocess_generators())
+
+
+def summary(parser):
+    """
+    Everything that the postprocessing sets, for each match.
+    """
+
+    return [
+        (
+            m.uid,
+            m.line,
+            m.text,
+            getattr(m, "startline", None),
+            getattr(m, "endline", None),
+        )
+        for m in parser.matches.values()
+    ]
+
+
+def test_assign_all():
+    """
+    The array-backed assign_all should give the same results as the
+    single-pass one.
+    """
+
+    parser = make_parser()
+    parser_arrays = make_parser()
+
+    buckets = assign_all(parser)
+    buckets_arrays = arrays.assign_all(parser_arrays)
+
+    assert summary(parser) == summary(parser_arrays)
+
+    def uids(buckets):
+        return {key: [m.uid for m in value] for key, value in buckets.items()}
+
+    assert uids(buckets) == uids(buckets_arrays)
+
+
+def test_assign_section_collectors():
+    """
+    The array-backed assign_section_collectors should find the same pairs as
+    the sweep.
+    """
+
+    parser = make_parser()
+    arrays.assign_all(parser)
+
+    matches = parser.matches.values()
+
+    pairs = assign_section_collectors(
+        [x for x in matches if isinstance(x, Section)],
+        [x for x in matches if isinstance(x, Collector)]
+    )
+
+    pairs_arrays = arrays.assign_section_collectors(parser)
+
+    assert len(pairs) == 5
+    assert sorted(pairs) == sorted(pairs_arrays)
+
+
+def test_section_spans():
+    """
+    Checks the spans directly, including a section type that only has one
+    section.
+    """
+
+    parser = make_parser()
+    match_arrays = arrays.MatchArrays(parser.matches)
+
+    indices, startlines, endlines = match_arrays.section_spans(100)
+
+    spans = [
+        (match_arrays.objects[index].id, start, end)
+        for index, start, end in zip(indices, startlines, endlines)
+    ]
+
+    lines = [
+        line for line, m in parser.matches.items() if isinstance(m, Section)
+    ]
+
+    assert spans == [
+        (0, lines[0], lines[2]),
+        (0, lines[2], 100),
+        (1, lines[1], 100),
+    ]
+
+
+def test_unmatched_removal():
+    """
+    A removal that is started but never ended should be left alone by both
+    versions of assign_all, in the same way.
+    """
+
+    parser = make_parser()
+    parser_arrays = make_parser()
+
+    for p in (parser, parser_arrays):
+        end = [
+            line for line, m in p.matches.items()
+            if isinstance(m, Removal) and m.se == "e"
+        ][0]
+
+        del p.matches[end]
+
+    assign_all(parser)
+    arrays.assign_all(parser_arrays)
+
+    assert summary(parser) == summary(parser_arrays)
+    assert len([m for m in parser.matches.values() if isinstance(m, Removal)]) == 1
+
+
+def test_prepare_once():
+    """
+    The MatchArrays from prepare can be shared by assign_all and
+    assign_section_collectors, giving the same pairs as building them
+    again, with the section spans only worked out once.
+    """
+
+    parser = make_parser()
+    match_arrays = arrays.prepare(parser)
+
+    arrays.assign_all(parser, match_arrays)
+
+    spans = match_arrays.section_spans(len(parser.text))
+    pairs = arrays.assign_section_collectors(parser, match_arrays)
+
+    assert match_arrays.section_spans(len(parser.text)) is spans
+    assert sorted(pairs) == sorted(arrays.assign_section_collectors(parser))
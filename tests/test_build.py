@@ -0,0 +1,128 @@
+"""
+Tests for building several documents at once.
+
+This can be found in build.py.
+"""
+
+from projection.build import build
+from projection.io import Database
+
+from helpers import write_document
+
+import os
+import pytest
+
+
+def write_documents(directory, databases, incremental=False):
+    """
+    Writes one document (and its configuration) per database in a
+    subdirectory of directory, and a manifest listing them. Returns the
+    manifest filename.
+    """
+
+    manifest = [f"incremental: {str(incremental).lower()}", "documents:"]
+
+    for number, database in enumerate(databases):
+        name = f"document{number}"
+        os.mkdir(os.path.join(directory, name))
+
+        write_document(
+            os.path.join(directory, name),
+            f"%%\\section{{Document {number}}}\n"
+            "Some text\n"
+            "%%\\keypoint{Important}\n",
+            database=database
+        )
+
+        manifest.append(f"  - tex: \"{name}/notes.tex\"")
+        manifest.append(f"    config: \"{name}/config.yml\"")
+
+    filename = os.path.join(directory, "manifest.yml")
+
+    with open(filename, "w") as file:
+        file.write("\n".join(manifest))
+
+    return filename
+
+
+def test_build(tmp_path):
+    """
+    Builds two documents, with their own databases, in two processes.
+    """
+
+    manifest = write_documents(str(tmp_path), ["one.db", "two.db"])
+
+    built = build(manifest, processes=2)
+
+    assert len(built) == 2
+
+    for number, name in enumerate(["one.db", "two.db"]):
+        db = Database(str(tmp_path / f"document{number}" / name))
+
+        sections = db.grab_sections()
+
+        assert len(sections) == 1
+        assert f"Document {number}" in sections[0].text
+        assert len(db.grab_collectors()) == 1
+
+
+def test_build_shared(tmp_path):
+    """
+    Builds two documents into the same database, twice, and checks that
+    the second build replaces the first.
+    """
+
+    manifest = write_documents(str(tmp_path), ["../shared.db"] * 2)
+
+    for _ in range(2):
+        build(manifest, processes=2)
+
+    db = Database(str(tmp_path / "shared.db"))
+
+    texts = sorted(x.text for x in db.grab_sections())
+
+    assert len(texts) == 2
+    assert "Document 0" in texts[0]
+    assert "Document 1" in texts[1]
+
+
+def test_build_shared_same_sections(tmp_path):
+    """
+    Two documents with the same section line get different uids, so each
+    section only has its own document's collectors.
+    """
+
+    manifest = write_documents(str(tmp_path), ["../shared.db"] * 2)
+
+    for number in range(2):
+        with open(tmp_path / f"document{number}" / "notes.tex", "w") as file:
+            file.write(
+                "%%\\section{Introduction}\n"
+                f"%%\\keypoint{{Point {number}}}\n"
+            )
+
+    build(manifest, processes=2)
+
+    db = Database(str(tmp_path / "shared.db"))
+
+    sections = db.grab_sections()
+
+    assert len({x.uid for x in sections}) == 2
+
+    for section in sections:
+        collectors = db.select_section_collectors(section.uid)
+
+        assert len(collectors) == 1
+
+
+def test_build_shared_incremental(tmp_path):
+    """
+    Incremental builds can't share a database.
+    """
+
+    manifest = write_documents(
+        str(tmp_path), ["../shared.db"] * 2, incremental=True
+    )
+
+    with pytest.raises(ValueError):
+        build(manifest)
@@ -0,0 +1,116 @@
+"""
+Tests for the pandoc output cache.
+
+This can be found in cache.py.
+"""
+
+from projection.parser.cache import PandocCache
+from projection.parser.objects import convert
+
+import os
+
+
+def test_get_put(tmp_path):
+    """
+    Stores an item in the cache and reads it back, and checks that the key
+    depends on the pandoc arguments.
+    """
+
+    cache = PandocCache(str(tmp_path))
+
+    key = cache.key("hello world", "/", ["--mathjax"])
+
+    assert cache.get(key) is None
+
+    cache.put(key, "hello world\n")
+
+    assert cache.get(key) == "hello world\n"
+    assert key != cache.key("hello world", "/", ["--mathjax", "--toc"])
+    assert key != cache.key("hello world", "/images/", ["--mathjax"])
+
+
+def test_eviction(tmp_path):
+    """
+    Checks that the least recently used items are evicted first.
+    """
+
+    cache = PandocCache(str(tmp_path), max_size=20, low_water=0.8)
+
+    cache.put("first", "a" * 8)
+    cache.put("second", "b" * 8)
+
+    # Make sure that 'first' is the least recently used.
+    os.utime(cache.path("first"), (0, 0))
+
+    cache.put("third", "c" * 8)
+
+    assert cache.get("first") is None
+    assert cache.get("second") == "b" * 8
+    assert cache.get("third") == "c" * 8
+    assert cache.size == 16
+
+
+def test_eviction_low_water(tmp_path, monkeypatch):
+    """
+    Once full, the cache is evicted down to its low-water mark, so the next
+    put doesn't have to evict again. Overwriting an entry doesn't count its
+    size twice.
+    """
+
+    cache = PandocCache(str(tmp_path), max_size=40, low_water=0.5)
+
+    for number in range(4):
+        cache.put(f"item{number}", "a" * 8)
+        os.utime(cache.path(f"item{number}"), (number, number))
+
+    cache.put("item0", "b" * 8)
+
+    assert cache.size == 32
+
+    cache.put("item4", "a" * 16)
+
+    assert cache.size <= 20
+
+    evictions = []
+    evict = cache.evict
+
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(evict()))
+
+    cache.put("item5", "a" * 8)
+
+    assert evictions == []
+
+
+def test_unicode(tmp_path):
+    """
+    Entries are stored as UTF-8, whatever the locale.
+    """
+
+    cache = PandocCache(str(tmp_path))
+
+    cache.put("quote", "it\u2019s")
+
+    with open(cache.path("quote"), "rb") as file:
+        assert file.read() == "it\u2019s".encode("utf-8")
+
+    assert cache.get("quote") == "it\u2019s"
+
+
+def test_convert(tmp_path):
+    """
+    Once a string has been converted, it should come straight from the
+    cache.
+    """
+
+    cache = PandocCache(str(tmp_path))
+
+    output = convert(r"\emph{hello}", "/", ["--wrap=preserve"], cache=cache)
+    key = cache.key(r"\emph{hello}", "/", ["--wrap=preserve"])
+
+    assert cache.get(key) == output
+
+    cache.put(key, "from the cache")
+
+    assert convert(
+        r"\emph{hello}", "/", ["--wrap=preserve"], cache=cache
+    ) == "from the cache"
@@ -0,0 +1,234 @@
+"""
+Tests for the configuration object and its stages.
+
+This can be found in config.py.
+"""
+
+from projection.parser.config import Config
+from projection.parser import cache, objects
+from projection.io import Database
+
+from helpers import write_document
+
+import os
+import pytest
+
+
+TEXT = (
+    "%%\\section{First}\n"
+    "Some text\n"
+    "%%\\keypoint{Important}\n"
+)
+
+
+def test_lazy(tmp_path):
+    """
+    Making a Config with run=False does nothing, and each stage only runs
+    the stages that it needs (once).
+    """
+
+    tex, config = write_document(str(tmp_path), TEXT)
+
+    configuration = Config(tex, config, run=False)
+
+    assert configuration.done == set()
+
+    configuration.load()
+
+    assert configuration.done == {"load"}
+    assert len(configuration.generators) == 2
+
+    configuration.match()
+
+    assert configuration.done == {"load", "match"}
+    assert len(configuration.parser.matches) == 2
+    # No pandoc yet, so the text is still the original.
+    assert configuration.parser.text[1] == "Some text\n"
+
+    parser = configuration.parser
+
+    configuration.match().convert()
+
+    assert configuration.parser is parser
+    assert configuration.done == {"load", "match", "convert"}
+    assert not os.path.exists(str(tmp_path / "notes.db"))
+
+
+def test_run(tmp_path):
+    """
+    By default, all of the stages run and the database is written.
+    """
+
+    tex, config = write_document(str(tmp_path), TEXT)
+
+    configuration = Config(tex, config)
+
+    assert configuration.done == set(Config.stages)
+
+    db = Database(str(tmp_path / "notes.db"))
+
+    assert len(db.grab_sections()) == 1
+    assert [x.text for x in db.grab_collectors()] == ["Important"]
+
+
+def test_skip(tmp_path):
+    """
+    Skipping convert writes the matches without running pandoc.
+    """
+
+    tex, config = write_document(str(tmp_path), TEXT)
+
+    configuration = Config(tex, config, run=False).skip("convert").persist()
+
+    assert "convert" in configuration.done
+
+    db = Database(str(tmp_path / "notes.db"))
+
+    sections = db.grab_sections()
+
+    assert len(sections) == 1
+    assert "Some text" in sections[0].text
+
+    with pytest.raises(ValueError):
+        configuration.skip("nonsense")
+
+
+def test_search(tmp_path):
+    """
+    With search: true, the database gets a search table, filled in with
+    the text of each section and collector.
+    """
+
+    tex, config = write_document(str(tmp_path), TEXT, search=True)
+
+    Config(tex, config)
+
+    db = Database(str(tmp_path / "notes.db"))
+
+    sections = db.grab_sections()
+
+    assert db.searchable
+    assert [x[0] for x in db.search("important")] == [sections[0].uid]
+    assert [x[0] for x in db.search("text")] == [sections[0].uid]
+
+    # The collector placeholders in the section text are not indexed.
+    assert db.search("collector") == []
+    assert db.search("projection*") == []
+
+
+def test_incremental_whole_document(tmp_path):
+    """
+    Incremental (cached) runs send the whole document through pandoc unless
+    processes is given, so environments can span sections.
+    """
+
+    tex, config = write_document(
+        str(tmp_path),
+        "\\documentclass{article}\n"
+        "\\begin{document}\n"
+        "%%\\section{First}\n"
+        "Some text\n"
+        "\\end{document}\n"
+    )
+
+    configuration = Config(tex, config, incremental=True)
+
+    assert configuration.parser.processes is None
+    assert "Some text" in configuration.parser.text
+
+
+def test_incremental_reuse(tmp_path, monkeypatch):
+    """
+    A second incremental run of an unchanged document doesn't run pandoc,
+    and after one section changes only its rows are rewritten.
+    """
+
+    tex, config = write_document(
+        str(tmp_path),
+        "%%\\section{First}\n"
+        "Some text\n"
+        "%%\\section{Second}\n"
+        "More text\n"
+    )
+
+    runs = []
+    run_pandoc = objects.ltmd.run_pandoc
+
+    def counted(*args, **kwargs):
+        runs.append(args)
+
+        return run_pandoc(*args, **kwargs)
+
+    monkeypatch.setattr(objects.ltmd, "run_pandoc", counted)
+
+    Config(tex, config, incremental=True)
+
+    assert len(runs) == 1
+
+    Config(tex, config, incremental=True)
+
+    assert len(runs) == 1
+
+    db = Database(str(tmp_path / "notes.db"))
+
+    def sections():
+        return {
+            x[0]: x[1:] for x in db.conn.execute(
+                "select uid, rowid, text from sections"
+            )
+        }
+
+    before = sections()
+
+    with open(tex, "w") as file:
+        file.write(
+            "%%\\section{First}\n"
+            "Some text\n"
+            "%%\\section{Second}\n"
+            "Changed text\n"
+        )
+
+    Config(tex, config, incremental=True)
+
+    assert len(runs) == 2
+
+    after = sections()
+
+    assert before.keys() == after.keys()
+
+    changed = [uid for uid in before if before[uid] != after[uid]]
+
+    assert len(changed) == 1
+    assert "Changed text" in after[changed[0]][1]
+    assert all(before[uid][0] == after[uid][0] for uid in before)
+
+
+def test_match_without_pandoc(tmp_path, monkeypatch):
+    """
+    Matching an incremental build doesn't open the pandoc cache (which
+    runs pandoc and makes its directory); converting does.
+    """
+
+    tex, config = write_document(str(tmp_path), TEXT)
+
+    versions = []
+    get_pandoc_version = cache.pypandoc.get_pandoc_version
+
+    def counted():
+        versions.append(True)
+
+        return get_pandoc_version()
+
+    monkeypatch.setattr(cache.pypandoc, "get_pandoc_version", counted)
+
+    configuration = Config(tex, config, incremental=True, run=False).match()
+
+    assert versions == []
+    assert configuration.parser.cache is None
+    assert not os.path.exists(configuration.cache_directory())
+
+    configuration.convert()
+
+    assert versions == [True]
+    assert configuration.parser.cache is not None
+    assert os.path.isdir(configuration.cache_directory())
@@ -3,7 +3,7 @@ Tests for the IO -- including database tests.
 """
 
 from projection.io import Database
-from projection.parser.generators import Collector, Section
+from projection.parser.generators import Collector, Section, Removal
 
 import os
 import uuid
@@ -36,3 +36,378 @@ def test_insertion_extraction():
 
     os.remove("test.db")
 
+
+
+def test_update_table():
+    """
+    Writes a set of collectors with update_table, then writes them again with
+    one changed and checks that only that row was rewritten.
+    """
+
+    db = Database("test_update.db")
+
+    collectors = [
+        Collector(input=f"test {x}", regex=".*?", id="keypoint", line=x)
+        for x in range(3)
+    ]
+
+    rows = [tuple(col.pack().values()) for col in collectors]
+
+    db.update_table("collectors", rows)
+
+    before = dict(db.conn.execute("select uid, rowid from collectors"))
+
+    changed = Collector(input="changed", regex=".*?", id="keypoint", line=1)
+    rows[1] = tuple(changed.pack().values())
+
+    db.update_table("collectors", rows)
+
+    after = dict(db.conn.execute("select uid, rowid from collectors"))
+
+    assert len(after) == 3
+    assert collectors[1].uid not in after
+    assert after[collectors[0].uid] == before[collectors[0].uid]
+    assert after[collectors[2].uid] == before[collectors[2].uid]
+    assert changed in db.grab_collectors()
+
+    # Moving every collector down a line keeps their uids, so each row is
+    # updated in place rather than replaced.
+    for collector in [collectors[0], changed, collectors[2]]:
+        collector.line += 1
+
+    rows = [
+        tuple(col.pack().values())
+        for col in [collectors[0], changed, collectors[2]]
+    ]
+
+    db.update_table("collectors", iter(rows))
+
+    moved = dict(db.conn.execute("select uid, rowid from collectors"))
+
+    assert moved == after
+    assert sorted(x.line for x in db.grab_collectors()) == [1, 2, 3]
+    assert db.conn.execute("select count(*) from hashes").fetchone()[0] == 3
+
+    del db
+
+    os.remove("test_update.db")
+
+
+def test_bulk_insertion():
+    """
+    Inserts several collectors and sections in one transaction and checks
+    that they all come back out.
+    """
+
+    db = Database("test_bulk.db")
+
+    collectors = [
+        Collector(input=f"test {x}", regex=".*?", id="keypoint", line=x)
+        for x in range(5)
+    ]
+
+    sections = [
+        Section(input=f"test {x}", regex=".*?", id="section") for x in range(5)
+    ]
+
+    db.insert_collectors(
+        [tuple(col.pack().values()) for col in collectors], commit=False
+    )
+    db.insert_sections(
+        [tuple(sec.pack().values()) for sec in sections], commit=False
+    )
+    db.commit()
+
+    assert db.grab_collectors() == collectors
+    assert db.grab_sections() == sections
+
+    del db
+
+    os.remove("test_bulk.db")
+
+
+def test_select():
+    """
+    Checks that select_collectors and select_sections pick out the items
+    with the right id in the given range of lines, and that they use the
+    indexes.
+    """
+
+    db = Database("test_select.db")
+
+    collectors = [
+        Collector(input=f"test {x}", regex=".*?", id=id, line=x)
+        for x in range(10) for id in ["keypoint", "question"]
+    ]
+
+    sections = []
+
+    for x in range(0, 10, 2):
+        sec = Section(input=f"test {x}", regex=".*?", id="section", line=x)
+        sec.startline = x
+        sec.endline = x + 2
+        sections.append(sec)
+
+    db.insert_collectors([tuple(col.pack().values()) for col in collectors])
+    db.insert_sections([tuple(sec.pack().values()) for sec in sections])
+
+    selected = db.select_collectors([2, 5], "keypoint")
+
+    assert [col.line for col in selected] == [2, 3, 4, 5]
+    assert all(col.id == "keypoint" for col in selected)
+
+    assert db.select_sections([2, 5], "section") == sections[1:3]
+    assert db.select_sections([2, 5], "lecture") == []
+
+    plan = db.conn.execute("""
+        explain query plan select * from collectors where id = ? and
+        (line between ? and ?)
+        """, ("keypoint", 2, 5)).fetchall()
+
+    assert "collectors_id_line" in str(plan)
+
+    del db
+
+    os.remove("test_select.db")
+
+
+def test_section_collectors():
+    """
+    Checks that select_section_collectors looks up the collectors in a
+    section through the section_collectors table (by index), and that the
+    table can be kept up to date with update_table.
+    """
+
+    db = Database("test_section_collectors.db")
+
+    collectors = [
+        Collector(
+            input=f"test {x}", regex=".*?", id=id, line=x, uid=f"{id}{x}"
+        )
+        for x in range(4) for id in ["keypoint", "question"]
+    ]
+
+    db.insert_collectors([col.pack_tuple() for col in collectors])
+    db.insert_section_collectors([
+        ("one", "keypoint1"), ("one", "question0"), ("one", "keypoint0"),
+        ("two", "keypoint3"),
+    ])
+
+    selected = db.select_section_collectors("one")
+
+    assert [col.uid for col in selected] == \
+        ["keypoint0", "question0", "keypoint1"]
+    questions = db.select_section_collectors("one", "question")
+
+    assert [col.uid for col in questions] == ["question0"]
+    assert db.select_section_collectors("three") == []
+
+    plan = db.conn.execute("""
+        explain query plan select * from section_collectors
+        where section = ?
+        """, ("one",)).fetchall()
+
+    assert "section_collectors_section" in str(plan)
+
+    db.update_table("section_collectors", [("two", "question3")])
+
+    assert db.select_section_collectors("one") == []
+    assert [col.uid for col in db.select_section_collectors("two")] == \
+        ["question3"]
+
+    del db
+
+    os.remove("test_section_collectors.db")
+
+
+def test_search():
+    """
+    Checks the full-text search table: section matches, collector matches
+    (which point at the sections that they are in, with each section only
+    given once), escaping of the snippets, and updates.
+    """
+
+    db = Database("test_search.db", search=True)
+
+    assert db.searchable
+
+    db.insert_section_collectors([("one", "keypoint"), ("two", "keypoint")])
+    db.insert_search_text([
+        ("section", "one", "The <!-- quantised harmonic oscillator"),
+        ("section", "two", "Lecture on perturbation theory"),
+        ("collector", "keypoint", "Energy levels are quantised"),
+        ("collector", "lonely", "Quantised, but in no section"),
+    ], commit=False)
+    db.commit()
+
+    results = db.search("oscillator")
+
+    assert results == [
+        ("one", "The &lt;!-- quantised harmonic <b>oscillator</b>")
+    ]
+    assert sorted(x[0] for x in db.search("quantised")) == ["one", "two"]
+    assert db.search("nothing") == []
+
+    db.update_table("search_text", [("section", "two", "Something else")])
+
+    assert db.search("oscillator") == []
+    assert [x[0] for x in db.search("something")] == ["two"]
+
+    del db
+
+    # The table is picked up again when the database is re-opened.
+    db = Database("test_search.db")
+
+    assert db.searchable
+    assert [x[0] for x in db.search("else")] == ["two"]
+
+    del db
+
+    os.remove("test_search.db")
+
+    db = Database("test_search.db")
+
+    assert not db.searchable
+
+    del db
+
+    os.remove("test_search.db")
+
+
+def test_iterators():
+    """
+    Checks that the iter_* functions stream all of the rows back out, in
+    batches smaller than the table, including removals.
+    """
+
+    db = Database("test_iterators.db")
+
+    collectors = [
+        Collector(input=f"test {x}", regex=".*?", id="keypoint", line=x)
+        for x in range(10)
+    ]
+
+    removal = Removal(input="test", regex=".*?", id="pdfonly", line=3, se="s")
+    removal.startline = 3
+    removal.endline = 5
+
+    db.insert_collectors([tuple(col.pack().values()) for col in collectors])
+    db.insert_removals([tuple(removal.pack().values())])
+
+    iterator = db.iter_collectors(batch_size=3)
+
+    assert next(iterator) == collectors[0]
+    assert list(iterator) == collectors[1:]
+    assert list(db.iter_removals(batch_size=3)) == [removal]
+
+    del db
+
+    os.remove("test_iterators.db")
+
+
+def test_pack_tuple():
+    """
+    pack_tuple should give the same values as pack, in the same order, and
+    the generators should not carry a __dict__.
+    """
+
+    col = Collector(input="test", regex=".*?", id="keypoint", line=0)
+    sec = Section(input="test", regex=".*?", id="section")
+    rem = Removal(input="test", regex=".*?", id="pdfonly", se="e")
+
+    for generator in [col, sec, rem]:
+        assert generator.pack_tuple() == tuple(generator.pack().values())
+        assert not hasattr(generator, "__dict__")
+        assert type(generator).from_row(generator.pack_tuple()) == generator
+
+
+def test_generator_types():
+    """
+    Each regex should only be stored once, in the generator_types table, and
+    the objects that come back out should share it.
+    """
+
+    db = Database("test_types.db")
+
+    collectors = [
+        Collector(input=f"test {x}", regex=r"test \d", id="keypoint")
+        for x in range(5)
+    ]
+
+    db.insert_collectors([col.pack_tuple() for col in collectors])
+
+    stored_types = db.conn.execute("select * from generator_types").fetchall()
+    stored_rows = db.conn.execute("select type from collectors").fetchall()
+
+    assert stored_types == [(1, r"test \d")]
+    assert stored_rows == [(1,)] * 5
+
+    output = db.grab_collectors()
+
+    assert output == collectors
+    assert all(col.regex is output[0].regex for col in output)
+
+    del db
+
+    os.remove("test_types.db")
+
+
+def test_generator_types_other_connection():
+    """
+    A syntax that another connection adds after we have opened the
+    database should still come back as its regex.
+    """
+
+    reader = Database("test_types_shared.db")
+    writer = Database("test_types_shared.db")
+
+    collector = Collector(input="test 1", regex=r"test \d", id="keypoint")
+
+    writer.insert_collectors([collector.pack_tuple()])
+
+    assert reader.grab_collectors() == [collector]
+    assert reader.grab_collectors()[0].regex == r"test \d"
+
+    del reader, writer
+
+    os.remove("test_types_shared.db")
+
+
+def test_upgrade_sections():
+    """
+    A sections table written before Section.title existed gets the column
+    added, and its rows come back without a title.
+    """
+
+    import sqlite3
+
+    conn = sqlite3.connect("test_upgrade.db")
+    conn.execute("""
+        create table sections
+        (input text, line int, level int, capture int,
+         type int, uid text, text text,
+         temporary_replacement text, output_text text,
+         startline int, endline int, id text)"""
+    )
+    conn.execute(
+        "insert into sections values (?,?,?,?,?,?,?,?,?,?,?,?)",
+        ("test", 0, 1, 0, ".*?", "uid", "text", "uid", "# test", 0, 1, "id")
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database("test_upgrade.db")
+
+    old = db.grab_sections()[0]
+
+    assert old.title is None
+
+    sec = Section(input="test", regex=".*?", id="section")
+    db.insert_section(sec.pack_tuple())
+
+    assert db.grab_sections()[1] == sec
+    assert db.grab_sections()[1].title == sec.title
+
+    del db
+
+    os.remove("test_upgrade.db")
@@ -0,0 +1,167 @@
+"""
+Tests for the combined matcher.
+
+This can be found in matcher.py.
+"""
+
+from projection.parser.matcher import Matcher, literal_prefix
+
+import re
+
+
+def test_dispatch():
+    """
+    Checks that each line is dispatched to the correct generator, including
+    expressions compiled with flags (as in config.py) and capturing groups.
+    """
+
+    def secgen(input):
+        return "section"
+
+    def colgen(input):
+        return "collector"
+
+    def remgen(input):
+        return "removal"
+
+    generators = {
+        re.compile(r"%%\\findme\{(.*?)\}", re.VERBOSE): secgen,
+        re.compile(r"%%\\findcollector{.*?}"): colgen,
+        re.compile(r"%%\\beginpdfonly"): remgen,
+    }
+
+    matcher = Matcher(generators)
+
+    assert matcher.match(r"%%\findme{Section}") is secgen
+    assert matcher.match(r"%%\findcollector{Collector}") is colgen
+    assert matcher.match(r"%%\beginpdfonly") is remgen
+    assert matcher.match(r"hello world") is False
+
+
+def test_no_generators():
+    """
+    An empty generators dictionary should never match.
+    """
+
+    matcher = Matcher({})
+
+    assert matcher.match(r"%%\findme{Section}") is False
+    assert matcher.match("") is False
+
+
+def test_uncombinable():
+    """
+    Expressions that share a named group cannot be combined, so the matcher
+    should fall back to trying them one at a time.
+    """
+
+    def first(input):
+        return "first"
+
+    def second(input):
+        return "second"
+
+    generators = {
+        re.compile(r"%%\\first{(?P<text>.*?)}"): first,
+        re.compile(r"%%\\second{(?P<text>.*?)}"): second,
+    }
+
+    matcher = Matcher(generators)
+
+    assert matcher.combined is None
+    assert matcher.match(r"%%\second{hello}") is second
+
+
+def test_backreferences():
+    """
+    Wrapping an expression in a group renumbers its groups, so expressions
+    that refer back to their own groups must not be combined.
+    """
+
+    def first(input):
+        return "first"
+
+    def second(input):
+        return "second"
+
+    generators = {
+        re.compile(r"%%\\foo\{(.*?)\}"): first,
+        re.compile(r"%%\\(b)\1ar"): second,
+    }
+
+    matcher = Matcher(generators)
+
+    assert matcher.combined is None
+    assert matcher.match(r"%%\bbar") is second
+    assert matcher.match(r"%%\foo{x}") is first
+
+    # An escaped backslash followed by a digit is not a reference.
+    matcher = Matcher({re.compile(r"%%\\\\1{(.*?)}"): first})
+
+    assert matcher.combined is not None
+    assert matcher.match(r"%%\\1{x}") is first
+
+
+def test_literal_prefix():
+    """
+    Checks the literal prefixes that are used to prefilter lines.
+    """
+
+    assert literal_prefix(re.compile(r"%%\\section\{(.*?)\}", re.VERBOSE)) \
+        == "%%\\section{"
+    assert literal_prefix(re.compile(r"%%\\findme{.*?}")) == "%%\\findme"
+    assert literal_prefix(re.compile(r"%%\\beginpdfonly")) == "%%\\beginpdfonly"
+    assert literal_prefix(re.compile(r"ab?c")) == "a"
+    assert literal_prefix(re.compile(r"\d+")) == ""
+    assert literal_prefix(re.compile(r"ab|cd")) == ""
+    assert literal_prefix(re.compile(r"ab", re.IGNORECASE)) == ""
+
+
+def test_candidates():
+    """
+    Only lines that contain the shared prefix should be candidates.
+    """
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): None,
+        re.compile(r"%%\\findcollector{.*?}"): None,
+    }
+
+    lines = [
+        r"hello world",
+        r"%%\findme{Section}",
+        r"%%\findcollector{Collector}",
+        r"goodbye world",
+    ]
+
+    matcher = Matcher(generators)
+
+    assert matcher.prefix == "%%\\find"
+    assert list(matcher.candidates(lines)) == [(1, lines[1]), (2, lines[2])]
+
+
+def test_search_groups():
+    """
+    The match object returned by search should belong to the generator's own
+    expression, so that its capturing groups are numbered as expected.
+    """
+
+    def colgen(input, match=None):
+        return "collector"
+
+    def secgen(input, match=None):
+        return "section"
+
+    generators = {
+        re.compile(r"%%\\findcollector{(.*?)}"): colgen,
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+    }
+
+    matcher = Matcher(generators)
+
+    generator, match = matcher.search(r"before %%\findme{Section} after")
+
+    assert generator is secgen
+    assert match[0] == r"%%\findme{Section}"
+    assert match[1] == "Section"
+    assert matcher.search(r"hello world") is None
@@ -190,3 +190,198 @@ def test_removal():
 
     assert parser.text == expected_output
 
+
+
+def test_embedded_placeholder():
+    """
+    Tests that placeholders that pandoc has embedded inside a longer line
+    are still found, and that only the placeholder is replaced.
+    """
+
+    input_text = [
+        r"hello world",
+        r"%%\findme{collector}",
+        r"goodbye world",
+        "",
+    ]
+
+    def colgen(input, **kwargs):
+        return Collector(input, r"%%\\findme{.*?}", **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{.*?}"): colgen,
+    }
+
+    parser = Parser(input_text, generators)
+
+    collector = parser.matches[1]
+
+    # Pretend pandoc has merged our placeholder into a paragraph.
+    parser.matches = {1: collector}
+    parser.text = [
+        r"hello world",
+        "",
+        "goodbye {} world".format(collector.temporary_replacement),
+        "",
+    ]
+
+    parser.find_new_line_numbers()
+
+    assert parser.matches == {2: collector}
+
+    parser.replace_temp_with_final()
+
+    assert parser.text[2] == "goodbye {} world".format(collector.output_text)
+
+
+def test_chunked():
+    """
+    Converting the text in chunks (one per section) with several pandoc
+    processes should give the same output as converting it all at once.
+    """
+
+    input_text = [
+        r"hello world",
+        r"%%\findme{Section}",
+        r"%%\findcollector{Collector}",
+        r"goodbye world",
+        r"%%\findme{Section 2}",
+        r"the end",
+        "",
+    ]
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, **kwargs)
+
+    def colgen(input, **kwargs):
+        return Collector(input, r"%%\\findcollector{.*?}", **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+        re.compile(r"%%\\findcollector{.*?}"): colgen,
+    }
+
+    def without_uids(parser):
+        text = "\n".join(parser.text)
+
+        for match in parser.matches.values():
+            text = text.replace(match.uid, "uid")
+
+        # Chunks are separated by blank lines, which markdown ignores.
+        return [line for line in text.split("\n") if line]
+
+    parser = Parser(input_text.copy(), generators)
+    chunked_parser = Parser(input_text.copy(), generators, processes=2)
+
+    assert "# Section 2" in chunked_parser.text
+    assert "<!-- Collector uid -->" in without_uids(chunked_parser)
+    assert without_uids(parser) == without_uids(chunked_parser)
+
+
+def test_chunked_document():
+    """
+    Chunks of a full document should carry the preamble (so that macros
+    defined there work in every chunk), and only be split in the body.
+    """
+
+    input_text = [
+        r"\documentclass{article}",
+        r"\newcommand{\vect}[1]{\mathbf{#1}}",
+        r"\begin{document}",
+        r"%%\findme{Section}",
+        r"A vector $\vect{x}$.",
+        r"%%\findme{Section 2}",
+        r"Another vector $\vect{y}$.",
+        r"\end{document}",
+        "",
+    ]
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+    }
+
+    parser = Parser(input_text.copy(), generators, run=False)
+    parser.run_matching()
+    parser.replace_with_temp()
+
+    chunks = parser.chunks()
+
+    assert len(chunks) == 2
+    assert all(chunk.startswith("\n".join(input_text[:3])) for chunk in chunks)
+    assert all(chunk.endswith("\\end{document}") for chunk in chunks)
+
+    whole = Parser(input_text.copy(), generators)
+    chunked = Parser(input_text.copy(), generators, processes=2)
+
+    text = "\n".join(chunked.text)
+
+    assert "\\vect" not in text
+    assert "\\mathbf{x}" in text and "\\mathbf{y}" in text
+    assert [x for x in whole.text if x] == [x for x in chunked.text if x]
+
+
+def test_stable_uids():
+    """
+    The uids should be the same from one run to the next, and repeated lines
+    should still get different uids.
+    """
+
+    input_text = [
+        r"hello world",
+        r"%%\beginpdfonly",
+        r"%%\endpdfonly",
+        r"%%\beginpdfonly",
+        r"%%\endpdfonly",
+        "",
+    ]
+
+    def remgens(input, **kwargs):
+        return Removal(input, r"%%\\beginpdfonly", se="s", id="pdfonly", **kwargs)
+
+    def remgene(input, **kwargs):
+        return Removal(input, r"%%\\endpdfonly", se="e", id="pdfonly", **kwargs)
+
+    generators = {
+        re.compile(r"%%\\beginpdfonly"): remgens,
+        re.compile(r"%%\\endpdfonly"): remgene
+    }
+
+    first = Parser(input_text.copy(), generators)
+    second = Parser(input_text.copy(), generators)
+
+    first_uids = [m.uid for m in first.matches.values()]
+    second_uids = [m.uid for m in second.matches.values()]
+
+    assert first_uids == second_uids
+    assert len(set(first_uids)) == 4
+
+
+def test_single_argument_generators():
+    """
+    Generators that only take the input line still work, and their objects
+    get the Parser's uids (so repeated lines get different ones).
+    """
+
+    input_text = [
+        r"%%\findme{collector}",
+        r"%%\findme{collector}",
+        "",
+    ]
+
+    def colgen(input):
+        return Collector(input, r"%%\\findme{.*?}")
+
+    generators = {
+        re.compile(r"%%\\findme{.*?}"): colgen,
+    }
+
+    parser = Parser(input_text, generators)
+
+    first, second = parser.matches[0], parser.matches[1]
+
+    assert first.uid != second.uid
+    assert parser.text[:2] == [first.output_text, second.output_text]
+    assert first.temporary_replacement == first.uid
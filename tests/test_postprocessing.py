@@ -5,12 +5,17 @@ Unit tests for postprocess.py
 from projection.parser.postprocess import \
         assign_section_line_numbers,\
         assign_section_text,\
+        assign_collector_line_numbers,\
         assign_removal_line_numbers,\
-        assign_removal_text
+        assign_removal_text,\
+        assign_all,\
+        assign_section_collectors
 
 
 from projection.parser.objects import Parser
-from projection.parser.generators import Section, Removal
+from projection.parser.generators import Section, Collector, Removal
+
+from helpers import postprocess_generators
 
 import re
 
@@ -175,3 +180,138 @@ def test_removal():
 
     assert parser.matches[1].text == expected_text
 
+
+
+def test_assign_all():
+    """
+    Unit test for the single-pass postprocessing function -- this should
+    give the same results as running each of the functions above per id.
+    """
+
+    input_text = [
+        r"hello world",
+        r"%%\findme{Section}",
+        r"%%\findyou{Section 2}",
+        r"%%\findcollector{Collector}",
+        r"%%\beginpdfonly",
+        r"THIS IS ONLY FOR THE PDF!",
+        r"%%\endpdfonly",
+        r"goodbye world",
+        r"%%\findme{Section 3}",
+        "",
+    ]
+
+    generators = postprocess_generators()
+
+    parser = Parser(input_text.copy(), generators)
+    parser_per_id = Parser(input_text.copy(), generators)
+
+    buckets = assign_all(parser)
+
+    for id in [0, 1]:
+        assign_section_line_numbers(parser_per_id, id=id)
+        assign_section_text(parser_per_id, id=id)
+
+    assign_collector_line_numbers(parser_per_id, id=2)
+    assign_removal_line_numbers(parser_per_id, id=3)
+    assign_removal_text(parser_per_id, id=3)
+
+    def summary(parser):
+        uids = [m.uid for m in parser.matches.values()]
+        output = []
+
+        for m in parser.matches.values():
+            text = m.text
+
+            # The two parsers will have made different uids.
+            for uid in uids:
+                text = text.replace(uid, "uid")
+
+            output.append((m.line, text, getattr(m, "endline", None)))
+
+        return output
+
+    assert summary(parser) == summary(parser_per_id)
+    assert len(buckets[(Section, 0)]) == 2
+    assert len(buckets[(Section, 1)]) == 1
+    assert len(buckets[(Collector, 2)]) == 1
+    assert len(buckets[(Removal, 3)]) == 1
+
+
+def test_section_view():
+    """
+    Sections that have been through assign_all should share the parser's
+    text rather than holding a copy, and build their text when asked.
+    """
+
+    input_text = [
+        r"hello world",
+        r"%%\findme{Section}",
+        r"goodbye world",
+        r"%%\findme{Section 2}",
+        "",
+    ]
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+    }
+
+    parser = Parser(input_text, generators)
+
+    assign_all(parser)
+
+    sections = list(parser.matches.values())
+
+    assert all(m.buffer is parser.text for m in sections)
+    assert [m.text for m in sections] == ["# Section\ngoodbye world", "# Section 2\n"]
+    assert sections[0].pack()["text"] == "# Section\ngoodbye world"
+
+    # Setting the text explicitly replaces the view.
+    sections[0].text = "replaced"
+
+    assert sections[0].buffer is None
+    assert sections[0].text == "replaced"
+
+
+def test_assign_section_collectors():
+    """
+    Checks the sweep that works out which sections each collector is in,
+    with two overlapping types of section.
+    """
+
+    def section(uid, id, startline, endline):
+        sec = Section(input=uid, regex=".*?", id=id, uid=uid)
+        sec.startline = startline
+        sec.endline = endline
+
+        return sec
+
+    def collector(uid, line):
+        return Collector(input=uid, regex=".*?", id="keypoint", line=line,
+            uid=uid)
+
+    sections = [
+        section("lecture 2", "Lectures", 5, 10),
+        section("lecture 1", "Lectures", 0, 5),
+        section("notes", "Notes", 2, 10),
+    ]
+
+    collectors = [
+        collector("c9", 9),
+        collector("c1", 1),
+        collector("c5", 5),
+        collector("c10", 10),
+    ]
+
+    pairs = assign_section_collectors(sections, collectors)
+
+    assert sorted(pairs) == sorted([
+        ("lecture 1", "c1"),
+        ("lecture 2", "c5"),
+        ("notes", "c5"),
+        ("lecture 2", "c9"),
+        ("notes", "c9"),
+    ])
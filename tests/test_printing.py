@@ -37,3 +37,16 @@ def test_print_collectors():
     assert expected_output == output
 
 
+
+
+def test_print_collectors_escaped():
+    """
+    The captured text of the collectors is escaped.
+    """
+
+    collector = Collector(
+        r"%%\findme{a < b & c}", r"%%\\findme{(.*?)}", capture=1
+    )
+
+    assert print_collectors([collector]) == \
+        "<ul>\n<li>a &lt; b &amp; c</li>\n</ul>"
@@ -0,0 +1,111 @@
+"""
+Tests for the static site builder.
+
+This can be found in frontend/site.py.
+"""
+
+from projection.parser.config import Config
+from projection.frontend.site import Site, slug, section_title
+from projection.parser.generators import Section
+
+from helpers import write_document
+
+import os
+
+
+def build_database(directory):
+    """
+    Writes and parses a document with two lectures, and returns the
+    configuration filename.
+    """
+
+    tex, config = write_document(
+        directory,
+        "%%\\lecture{One}\n"
+        "Some text\n"
+        "%%\\keypoint{First point}\n"
+        "\n"
+        "%%\\lecture{Two}\n"
+        "More text\n"
+        "%%\\keypoint{Second point}\n",
+        sections=[{"name": "Lectures", "syntax": "lecture", "level": 2}],
+        pages=[
+            {"name": "Glossary", "type": "glossary"},
+            {"name": "All Lectures", "type": "subpages"},
+            {
+                "name": "About",
+                "type": "plain",
+                "content": "About *these* notes."
+            },
+        ],
+        title="Notes"
+    )
+
+    Config(tex, config)
+
+    return config
+
+
+def test_slug():
+    """
+    Tests frontend.site.slug.
+    """
+
+    assert slug("All Lectures") == "all-lectures"
+    assert slug("!!") == "page"
+
+
+def test_section_title():
+    """
+    Section titles come from the captured text of the input, including for
+    sections with level 0 (which have no heading).
+    """
+
+    regex = r"%%\\lecture{(.*?)}"
+
+    hidden = Section(r"%%\lecture{One}", regex, id="Notes", capture=1, level=0)
+    shown = Section(r"%%\lecture{Two}", regex, id="Notes", capture=1, level=2)
+
+    assert section_title(hidden) == "One"
+    assert section_title(shown) == "Two"
+
+
+def test_build(tmp_path):
+    """
+    Builds a site, and checks that each lecture has a page with its own
+    keypoints on it.
+    """
+
+    config = build_database(str(tmp_path))
+    output = str(tmp_path / "site")
+
+    written = Site(config, output, processes=2).build()
+
+    assert sorted(written) == sorted([
+        "lectures-0.html",
+        "lectures-1.html",
+        "glossary.html",
+        "all-lectures.html",
+        "about.html",
+        "index.html",
+    ])
+
+    pages = {}
+
+    for filename in written:
+        with open(os.path.join(output, filename), "r") as file:
+            pages[filename] = file.read()
+
+    assert "<title>One - Notes</title>" in pages["lectures-0.html"]
+    assert "First point" in pages["lectures-0.html"]
+    assert "Second point" not in pages["lectures-0.html"]
+    assert "Second point" in pages["lectures-1.html"]
+    assert "%%\\keypoint" not in pages["lectures-0.html"]
+
+    assert pages["glossary.html"].index("First point") < \
+        pages["glossary.html"].index("Second point")
+
+    assert "<em>these</em>" in pages["about.html"]
+
+    for page in ["lectures-0.html", "lectures-1.html", "about.html"]:
+        assert f"href=\"{page}\"" in pages["index.html"]
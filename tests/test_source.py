@@ -0,0 +1,204 @@
+"""
+Tests for the streaming TeX reader.
+
+This can be found in source.py.
+"""
+
+from projection.parser.source import TexSource, MappedTexSource
+from projection.parser.objects import Parser
+from projection.parser.generators import Section
+
+import os
+import re
+
+
+def write_document(directory):
+    """
+    Writes a main document that includes two chapters, one of which is in
+    a subdirectory. Returns the filename of the main document.
+    """
+
+    os.mkdir(os.path.join(directory, "chapters"))
+
+    files = {
+        "main.tex": (
+            "hello world\n"
+            "\\input{one}\n"
+            "  \\include{chapters/two.tex} % two\n"
+            "goodbye world\n"
+        ),
+        "one.tex": "%%\\findme{One}\none\n",
+        "chapters/two.tex": "%%\\findme{Two}\ntwo\n",
+    }
+
+    for name, content in files.items():
+        with open(os.path.join(directory, name), "w") as file:
+            file.write(content)
+
+    return os.path.join(directory, "main.tex")
+
+
+def test_expansion(tmp_path):
+    """
+    Checks that the inputs are expanded in place, and that each line knows
+    where it came from.
+    """
+
+    main = write_document(str(tmp_path))
+    source = TexSource(main)
+
+    assert list(source) == [
+        "hello world\n",
+        "%%\\findme{One}\n",
+        "one\n",
+        "%%\\findme{Two}\n",
+        "two\n",
+        "goodbye world\n",
+    ]
+
+    one = os.path.join(str(tmp_path), "one.tex")
+    two = os.path.join(str(tmp_path), "chapters/two.tex")
+
+    assert source.origin(0) == (main, 0)
+    assert source.origin(2) == (one, 1)
+    assert source.origin(3) == (two, 0)
+    assert source.origin(5) == (main, 3)
+
+
+def test_parser_origins(tmp_path):
+    """
+    The Parser should read the source in one pass, keep its lines, and
+    record the origin of each match.
+    """
+
+    main = write_document(str(tmp_path))
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+    }
+
+    parser = Parser(TexSource(main), generators)
+
+    origins = {
+        m.text: parser.origins[m.uid] for m in parser.matches.values()
+    }
+
+    assert "# Two" in parser.text
+    assert origins == {
+        "One": (os.path.join(str(tmp_path), "one.tex"), 0),
+        "Two": (os.path.join(str(tmp_path), "chapters/two.tex"), 0),
+    }
+
+
+def test_mapped(tmp_path):
+    """
+    MappedTexSource should behave like the list from file.readlines(), and
+    find its candidate lines from the raw bytes.
+    """
+
+    filename = os.path.join(str(tmp_path), "mapped.tex")
+
+    with open(filename, "w") as file:
+        file.write("hello\n%%\\findme{One}\n\nworld\n%%\\findme{Two}\nend")
+
+    with open(filename, "r") as file:
+        expected = file.readlines()
+
+    source = MappedTexSource(filename)
+
+    assert len(source) == len(expected)
+    assert list(source) == expected
+    assert source[1:4] == expected[1:4]
+    assert source[-1] == "end"
+
+    assert list(source.candidates("%%\\find")) == [
+        (1, "%%\\findme{One}\n"),
+        (4, "%%\\findme{Two}\n"),
+    ]
+
+    source[1] = "replaced"
+    expected[1] = "replaced"
+
+    assert list(source) == expected
+    assert source[0:3] == expected[0:3]
+
+
+def test_mapped_parser(tmp_path):
+    """
+    The Parser should give the same output for a MappedTexSource as for the
+    lines of the same file.
+    """
+
+    filename = os.path.join(str(tmp_path), "mapped.tex")
+
+    with open(filename, "w") as file:
+        file.write("hello\n%%\\findme{One}\nworld\n%%\\findme{Two}\n")
+
+    def secgen(input, **kwargs):
+        return Section(input, r"%%\\findme{(.*?)}", capture=1, **kwargs)
+
+    generators = {
+        re.compile(r"%%\\findme{(.*?)}"): secgen,
+    }
+
+    with open(filename, "r") as file:
+        parser = Parser(file.readlines(), generators)
+
+    mapped_parser = Parser(MappedTexSource(filename), generators, processes=2)
+
+    assert "# Two" in mapped_parser.text
+    assert [l for l in parser.text if l] == [l for l in mapped_parser.text if l]
+
+
+def test_mapped_line_endings(tmp_path):
+    """
+    Files with \r\n line endings should come out of MappedTexSource as they
+    do from TexSource (text mode), with only \n.
+    """
+
+    filename = os.path.join(str(tmp_path), "windows.tex")
+
+    with open(filename, "wb") as file:
+        file.write(b"hello\r\n%%\\findme{One}\r\n\r\nworld")
+
+    expected = list(TexSource(filename))
+    source = MappedTexSource(filename)
+
+    assert expected == ["hello\n", "%%\\findme{One}\n", "\n", "world"]
+    assert list(source) == expected
+    assert source[0:2] == expected[0:2]
+    assert source[1] == expected[1]
+    assert list(source.candidates("%%\\find")) == [(1, expected[1])]
+
+    # Both sources read the file with the same encoding.
+    with open(filename, "wb") as file:
+        file.write("caf\u00e9\r\n".encode("latin-1"))
+
+    assert list(MappedTexSource(filename, encoding="latin-1")) == \
+        list(TexSource(filename, encoding="latin-1")) == ["caf\u00e9\n"]
+
+
+def test_mapped_close(tmp_path):
+    """
+    MappedTexSource can be closed (or used as a context manager), which
+    releases the mapping.
+    """
+
+    filename = os.path.join(str(tmp_path), "mapped.tex")
+
+    with open(filename, "w") as file:
+        file.write("hello\nworld\n")
+
+    with MappedTexSource(filename) as source:
+        assert list(source) == ["hello\n", "world\n"]
+
+    assert source.map.closed
+
+    # Empty files are not mapped, but can still be closed.
+    with open(filename, "w") as file:
+        pass
+
+    MappedTexSource(filename).close()
@@ -0,0 +1,77 @@
+"""
+Tests for the page templates.
+
+This can be found in frontend/template.py.
+"""
+
+from projection.frontend.template import Template, TemplateLoader
+
+import io
+import os
+import pytest
+
+
+def test_render():
+    """
+    Fills in a template with a string and with a generator of strings.
+    """
+
+    template = Template.compile("<h1>{{ title }}</h1>\n{{content}}!")
+
+    def content():
+        yield "<p>one</p>"
+        yield "<p>two</p>"
+
+    output = io.StringIO()
+    template.stream(output, title="Hello", content=content())
+
+    assert output.getvalue() == "<h1>Hello</h1>\n<p>one</p><p>two</p>!"
+    assert template.render(title="", content="") == "<h1></h1>\n!"
+
+    with pytest.raises(KeyError):
+        template.render(title="Hello")
+
+
+def test_loader_cache(tmp_path):
+    """
+    Checks that compiled templates are stored in the cache, keyed by their
+    text, and read back from it.
+    """
+
+    directory = str(tmp_path / "templates")
+    cache = str(tmp_path / "cache")
+
+    os.mkdir(directory)
+
+    with open(os.path.join(directory, "page.html"), "w") as file:
+        file.write("<title>{{ title }}</title>")
+
+    loader = TemplateLoader(directory, cache=cache)
+    template = loader.get("page.html")
+
+    assert loader.get("page.html") is template
+    assert len(os.listdir(cache)) == 1
+
+    # A new loader reads the compiled form from the cache.
+    assert TemplateLoader(directory, cache=cache).get("page.html").parts == \
+        template.parts
+
+    with open(os.path.join(directory, "page.html"), "w") as file:
+        file.write("<h1>{{ title }}</h1>")
+
+    loader = TemplateLoader(directory, cache=cache)
+
+    assert loader.get("page.html").render(title="Hi") == "<h1>Hi</h1>"
+    assert len(os.listdir(cache)) == 2
+
+
+def test_default():
+    """
+    The default page template has everything that the site builder uses.
+    """
+
+    page = TemplateLoader().get("page.html")
+
+    output = page.render(title="A", site_title="B", content="C")
+
+    assert "<title>A - B</title>" in output
@@ -0,0 +1,106 @@
+"""
+Tests for watching a document and rebuilding it.
+
+This can be found in watch.py.
+"""
+
+from projection.watch import Watcher
+
+import helpers
+
+import os
+
+
+def write_document(directory):
+    """
+    Writes a document that \\input{}s a chapter, and its configuration.
+    Returns the filenames of the document, chapter and configuration.
+    """
+
+    tex, config = helpers.write_document(
+        directory,
+        "%%\\section{First}\nSome text\n\\input{chapter}\n",
+        collectors=[],
+        cache=os.path.join(directory, "cache")
+    )
+
+    chapter = os.path.join(directory, "chapter.tex")
+
+    with open(chapter, "w") as file:
+        file.write("%%\\section{Second}\nMore text\n")
+
+    return tex, chapter, config
+
+
+def test_rebuild(tmp_path):
+    """
+    Builds a document, changes an included file, and checks that the change
+    is noticed and that the rebuild re-uses the database and cache.
+    """
+
+    tex, chapter, config = write_document(str(tmp_path))
+
+    watcher = Watcher(tex, config, interval=0.01, debounce=0.01)
+    watcher.rebuild()
+
+    assert watcher.files == {tex, chapter, config}
+
+    db = watcher.db
+    cache = watcher.cache
+
+    assert len(db.grab_sections()) == 2
+
+    before = watcher.snapshot()
+
+    with open(chapter, "w") as file:
+        file.write(
+            "%%\\section{Second}\nMore text\n%%\\section{Third}\nEven more\n"
+        )
+
+    after = watcher.wait(before)
+
+    assert after[chapter] != before[chapter]
+
+    watcher.rebuild()
+
+    assert watcher.db is db
+    assert watcher.cache is cache
+    assert len(db.grab_sections()) == 3
+
+    watcher.close()
+
+
+def test_run_error(tmp_path, capsys):
+    """
+    Errors in a build are printed rather than stopping the watcher, and a
+    missing \\input{} file is watched so that creating it rebuilds.
+    """
+
+    tex, chapter, config = write_document(str(tmp_path))
+
+    os.remove(chapter)
+
+    watcher = Watcher(tex, config, interval=0.01, debounce=0.01)
+    watcher.run(rebuilds=0)
+
+    assert "FileNotFoundError" in capsys.readouterr().err
+    assert tex in watcher.files
+    assert chapter in watcher.files
+
+    watcher.close()
+
+
+def test_rebuild_mapped(tmp_path):
+    """
+    With mapped=True, the .tex file's mapping is closed after each rebuild.
+    """
+
+    tex, chapter, config = write_document(str(tmp_path))
+
+    watcher = Watcher(tex, config, mapped=True)
+    built = watcher.rebuild()
+
+    assert built.text_data.map.closed
+    assert len(watcher.db.grab_sections()) == 1
+
+    watcher.close()